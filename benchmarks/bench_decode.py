@@ -0,0 +1,119 @@
+"""Micro-benchmark: projected registry decoding (npi_decode) against json.loads plus dict extract_data.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_decode --pages 200
+
+Bodies are stub registry pages padded with the fields the live API also returns
+(identifiers, other names, practice locations, timestamps) that the app never reads.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import npi_decode
+from streamlit_app import extract_data
+
+from benchmarks import stub_server
+
+
+# dict-based extract_data as it shipped before npi_decode, kept as the benchmark reference
+def legacy_extract_data(data):
+    extracted_data = []
+    for result in data.get("results", []):
+        basic_info = result.get("basic", {})
+        name = f"{basic_info.get('first_name', '')} {basic_info.get('middle_name', '')} {basic_info.get('last_name', '')}".strip()
+        primary_taxonomy = ""
+        primary_license = ""
+        for taxonomy in result.get("taxonomies", []):
+            if taxonomy.get("primary", False):
+                primary_taxonomy = taxonomy.get("desc", "")
+                primary_license = taxonomy.get("license", "")
+                break
+        addresses = result.get("addresses", [])
+        primary_address = primary_city = primary_state = ""
+        if len(addresses) > 0:
+            primary_address = "\n".join(filter(None, [
+                addresses[0].get('address_1', ''),
+                addresses[0].get('address_2', ''),
+                f"{addresses[0].get('city', '')}, {addresses[0].get('state', '')} {addresses[0].get('postal_code', '')}",
+                addresses[0].get('country_name', ''),
+                f"Phone: {addresses[0].get('telephone_number', '')}"
+            ]))
+            primary_city = addresses[0].get('city', '')
+            primary_state = addresses[0].get('state', '')
+        emails = "\n".join(endpoint.get("endpoint", "") for endpoint in result.get("endpoints", []))
+        extracted_data.append({
+            "NPI": result.get("number", ""), "Name": name, "Primary Taxonomy": primary_taxonomy,
+            "Primary License": primary_license, "Primary Practice Address": primary_address,
+            "Primary City": primary_city, "Primary State": primary_state, "API Email": emails,
+        })
+    return extracted_data
+
+
+# Function to build one registry response body of `size` results, padded like the live API
+def registry_body(size, seed):
+    data = stub_server.registry_response({"state": "CA", "limit": str(size), "seed": str(seed)}, size)
+    for i, result in enumerate(data["results"]):
+        result.update({
+            "created_epoch": "1117584000000", "enumeration_type": "NPI-1", "last_updated_epoch": "1183852800000",
+            "identifiers": [{"code": "05", "desc": "MEDICAID", "identifier": f"{i:08d}", "issuer": "", "state": "CA"}] * 3,
+            "other_names": [{"type": "Former Name", "code": "1", "first_name": "FORMER", "last_name": f"NAME{i}"}],
+            "practiceLocations": [dict(result["addresses"][0], address_purpose="PRACTICE")] * 2,
+        })
+        result["basic"].update({"credential": "M.D.", "sole_proprietor": "NO", "sex": "F", "status": "A",
+                                "enumeration_date": "2005-06-01", "last_updated": "2007-07-08"})
+    return json.dumps(data)
+
+
+# Function to time fn over the bodies, returning the best of `repeat` runs in seconds
+def best_time(fn, bodies, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for body in bodies:
+            fn(body)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+# Function to measure the memory held by the decoded responses of every body at once
+def retained_bytes(decode, bodies):
+    tracemalloc.start()
+    decoded = [decode(body) for body in bodies]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200, help="registry responses to decode")
+    parser.add_argument("--page-size", type=int, default=200, help="results per response (the API maximum is 200)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    bodies = [registry_body(args.page_size, seed) for seed in range(args.pages)]
+
+    # The projected path must produce the same output rows
+    for body in bodies:
+        assert extract_data(npi_decode.registry_from_json(body)) == legacy_extract_data(json.loads(body))
+
+    legacy = best_time(lambda body: legacy_extract_data(json.loads(body)), bodies, args.repeat)
+    decode_only = best_time(npi_decode.registry_from_json, bodies, args.repeat)
+    projected = best_time(lambda body: extract_data(npi_decode.registry_from_json(body)), bodies, args.repeat)
+    legacy_memory = retained_bytes(json.loads, bodies)
+    projected_memory = retained_bytes(npi_decode.registry_from_json, bodies)
+
+    print(f"responses: {args.pages} x {args.page_size} results, {sum(map(len, bodies)) / 2**20:.1f} MiB of JSON, decoder: {npi_decode.DECODER}")
+    print(f"json.loads + legacy_extract_data: {legacy:.3f}s")
+    print(f"registry_from_json:               {decode_only:.3f}s")
+    print(f"registry_from_json + extract_data: {projected:.3f}s ({legacy / projected:.2f}x)")
+    print(f"retained after decode: json.loads {legacy_memory / 2**20:.1f} MiB, "
+          f"registry_from_json {projected_memory / 2**20:.1f} MiB ({legacy_memory / max(projected_memory, 1):.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Micro-benchmark: column-oriented parse_page / parse_data against the original row-by-row parser.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parse_data --rows 100000
+"""
+import argparse
+import random
+import time
+
+from streamlit_app import page_records, parse_data, parse_page
+
+
+# Row-by-row parser as it shipped before parse_columns, kept as the benchmark reference
+def legacy_parse_data(npi_results, entity_type):
+    cleaned_data = []
+
+    for i in range(len(npi_results["NPI"])):
+        npi = npi_results["NPI"][i]
+        name = npi_results["name.full"][i]
+        provider_type = npi_results["provider_type"][i]
+        addr_practice = npi_results["addr_practice.full"][i]
+        city = npi_results["addr_practice.city"][i]
+        state = npi_results["addr_practice.state"][i]
+        zip_code = npi_results["addr_practice.zip"][i]
+        phone = npi_results["addr_practice.phone"][i]
+        country = npi_results["addr_practice.country"][i]
+        credential = npi_results["name.credential"][i]
+
+        # Initialize primary taxonomy as None
+        primary_taxonomy = None
+
+        # Get the licenses information
+        licenses = npi_results["licenses"][i]
+
+        # First, try to find the license with is_primary_taxonomy == "Y"
+        for license_group in licenses:
+            taxonomy_info = license_group.get('taxonomy')
+            is_primary = license_group.get('is_primary_taxonomy')
+            
+            if is_primary == "Y" and taxonomy_info:
+                primary_taxonomy = taxonomy_info
+                break
+
+        # If no "Y", check for is_primary_taxonomy == "X"
+        if not primary_taxonomy:
+            for license_group in licenses:
+                taxonomy_info = license_group.get('taxonomy')
+                is_primary = license_group.get('is_primary_taxonomy')
+                
+                if is_primary == "X" and taxonomy_info:
+                    primary_taxonomy = taxonomy_info
+                    break
+
+        # Fallback: If no "Y" or "X", use the first available taxonomy
+        if not primary_taxonomy and licenses:
+            primary_taxonomy = licenses[0].get('taxonomy')
+
+        # Append the cleaned data
+        cleaned_data.append({
+            "NPI": npi,
+            "Name": name,
+            "Provider Type": provider_type,
+            "Taxonomy Code": primary_taxonomy.get("code", "None") if primary_taxonomy else "None",
+            "Taxonomy Grouping": primary_taxonomy.get("grouping", "None") if primary_taxonomy else "None",
+            "Taxonomy Classification": primary_taxonomy.get("classification", "None") if primary_taxonomy else "None",
+            "Taxonomy Specialization": primary_taxonomy.get("specialization", "None") if primary_taxonomy else "None",
+            "Address": addr_practice,
+            "City": city,
+            "State": state,
+            "ZIP Code": zip_code,
+            "Phone": phone,
+            "Country": country,
+            "Credential": credential,
+            "Entity Type":entity_type
+        })
+    
+    return cleaned_data
+
+
+# Function to build a synthetic clinicaltables page with the same columns fetch_npi_page returns
+def synthetic_page(rows, seed=0):
+    rng = random.Random(seed)
+    flags = ["Y", "X", "N", None]
+    taxonomies = [
+        {"code": f"20{i:02d}00000X", "grouping": f"Grouping {i % 7}",
+         "classification": f"Classification {i % 31}", "specialization": f"Specialization {i}"}
+        for i in range(60)
+    ]
+    licenses = []
+    for _ in range(rows):
+        licenses.append([
+            {"taxonomy": rng.choice(taxonomies + [None]), "is_primary_taxonomy": rng.choice(flags)}
+            for _ in range(rng.randint(0, 4))
+        ])
+    return {
+        "NPI": [str(1000000000 + i) for i in range(rows)],
+        "name.full": [f"PROVIDER {i}" for i in range(rows)],
+        "provider_type": [rng.choice(["Physician", "Nurse", "Clinic"]) for _ in range(rows)],
+        "addr_practice.full": [f"{i} MAIN ST, TOWN, ST 00000" for i in range(rows)],
+        "addr_practice.city": [rng.choice(["TOWN", "CITY", "VILLAGE"]) for _ in range(rows)],
+        "addr_practice.state": [rng.choice(["CA", "NY", "TX", "FL"]) for _ in range(rows)],
+        "addr_practice.zip": [f"{rng.randint(0, 99999):05d}" for _ in range(rows)],
+        "addr_practice.phone": [f"555-{rng.randint(0, 9999999):07d}" for _ in range(rows)],
+        "addr_practice.country": ["US"] * rows,
+        "name.credential": [rng.choice(["MD", "DO", "NP", ""]) for _ in range(rows)],
+        "licenses": licenses,
+    }
+
+# Function to time fn over the pages, returning the best of `repeat` runs in seconds
+def best_time(fn, pages, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            fn(page, "individual")
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="total synthetic rows")
+    parser.add_argument("--page-size", type=int, default=500, help="rows per synthetic page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = [synthetic_page(min(args.page_size, args.rows - start), seed=start)
+             for start in range(0, args.rows, args.page_size)]
+
+    # The new parsers must reproduce the old output exactly
+    for page in pages:
+        expected = legacy_parse_data(page, "individual")
+        assert parse_data(page, "individual") == expected
+        assert page_records(parse_page(page, "individual")) == expected
+
+    legacy = best_time(legacy_parse_data, pages, args.repeat)
+    records = best_time(parse_data, pages, args.repeat)
+    columns = best_time(parse_page, pages, args.repeat)
+    print(f"rows: {args.rows} in {len(pages)} pages")
+    print(f"legacy_parse_data:        {legacy:.3f}s")
+    print(f"parse_data (records):     {records:.3f}s ({legacy / records:.2f}x)")
+    print(f"parse_page (column page): {columns:.3f}s ({legacy / columns:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Micro-benchmark: npi_store.ResultStore against a list of record dicts plus pd.DataFrame.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_store --rows 1000000
+
+Reports memory per record, build time and the filter / sort times the result table uses.
+"""
+import argparse
+import time
+import tracemalloc
+
+import pandas as pd
+
+import npi_store
+from streamlit_app import EXTRACT_COLUMNS, parse_columns, parse_data
+
+from benchmarks.bench_parse_data import synthetic_page
+
+
+# Function to time fn once, returning (result, seconds, peak traced bytes)
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def build_records(pages):
+    records = []
+    for page in pages:
+        records.extend(parse_data(page, "individual"))
+    return records
+
+
+def build_store(pages):
+    store = npi_store.ResultStore(EXTRACT_COLUMNS)
+    for page in pages:
+        store.append_columns(parse_columns(page, "individual"))
+    return store
+
+
+# Function to time the filter and sort render_results runs on a frame
+def table_ops(df):
+    started = time.perf_counter()
+    state = df["State"]
+    if isinstance(state.dtype, pd.CategoricalDtype):
+        categories = state.cat.categories
+        df[state.isin(categories[categories.astype(str).str.contains("ca", case=False, regex=False)])]
+    else:
+        df[state.astype(str).str.contains("ca", case=False, regex=False)]
+    filtered = time.perf_counter() - started
+    started = time.perf_counter()
+    df.sort_values("Taxonomy Classification", kind="stable")
+    return filtered, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="total synthetic rows")
+    parser.add_argument("--page-size", type=int, default=500, help="rows per synthetic page")
+    args = parser.parse_args()
+
+    pages = [synthetic_page(min(args.page_size, args.rows - start), seed=start)
+             for start in range(0, args.rows, args.page_size)]
+
+    records, records_seconds, records_peak = measure(lambda: build_records(pages))
+    records_frame, records_frame_seconds, records_frame_peak = measure(lambda: pd.DataFrame(records, columns=EXTRACT_COLUMNS))
+    store, store_seconds, store_peak = measure(lambda: build_store(pages))
+    store_frame, store_frame_seconds, store_frame_peak = measure(store.to_frame)
+
+    records_bytes = npi_store.records_nbytes(records)
+    print(f"rows: {args.rows} in {len(pages)} pages")
+    print(f"list of dicts: {records_bytes / args.rows:.0f} bytes/record, built in {records_seconds:.2f}s "
+          f"(peak {records_peak / 2**20:.0f} MiB); DataFrame {records_frame_seconds:.2f}s (peak {records_frame_peak / 2**20:.0f} MiB)")
+    print(f"ResultStore:   {store.bytes_per_record():.0f} bytes/record, built in {store_seconds:.2f}s "
+          f"(peak {store_peak / 2**20:.0f} MiB); to_frame {store_frame_seconds:.2f}s (peak {store_frame_peak / 2**20:.0f} MiB)")
+    print(f"memory: {records_bytes / store.nbytes():.1f}x smaller")
+    for name, df in (("object DataFrame", records_frame), ("store DataFrame", store_frame)):
+        filtered, sorted_ = table_ops(df)
+        print(f"{name:17s} filter {filtered:.3f}s, sort {sorted_:.3f}s, frame {df.memory_usage(deep=True).sum() / 2**20:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Benchmark scenarios for the Match and Extract pipelines against the local API stub.
+
+Run from the repository root:
+
+    python -m benchmarks.run                      # all scenarios
+    python -m benchmarks.run process_file --rows 2000 --latency 0.1 --error-rate 0.02
+    python -m benchmarks.run --json results.json
+
+Each scenario reports throughput, p50/p99 run time over --repeat runs, client-side
+request latency (from npi_metrics) and the process peak RSS after the scenario.
+Peak RSS is process-wide and only grows, so run one scenario at a time for
+isolated memory figures.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import openpyxl
+import pandas as pd
+
+import npi_cache
+import npi_client
+import npi_decode
+import npi_ratelimit
+from npi_metrics import metrics
+from streamlit_app import download_dataframe_as_excel, extract_data, fetch_npi_data, parse_data, process_file
+
+from benchmarks import stub_server
+from benchmarks.bench_parse_data import synthetic_page
+
+# Requests per second allowed to the stub: high enough that the client, not the limiter, is measured
+STUB_RATE_LIMIT = 100000
+
+
+# Function to route every NPI client call to the stub and bypass the on-disk cache
+def use_stub(base_url, pool_size):
+    npi_client.NPPES_URL = base_url + "/api/"
+    npi_client.CLINICALTABLES_URL = base_url + "/api/"
+    npi_client.POOL_SIZES[base_url] = pool_size
+    npi_client.reset_session()
+    # The stub serves as fast as it can; the default limit for unlisted hosts would cap every scenario
+    npi_ratelimit.set_host_limits(urlparse(base_url).netloc, STUB_RATE_LIMIT)
+    npi_cache.get_cache().mode = "off"
+
+
+# Function to write a synthetic Match roster with a share of repeated providers
+def write_roster(path, rows, duplicate_share=0.3, seed=0):
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["First Name", "Last Name", "Phone"])
+    written = []
+    for _ in range(rows):
+        if written and rng.random() < duplicate_share:
+            row = rng.choice(written)
+        else:
+            row = [f"FIRST{rng.randint(0, 5000)}", f"LAST{rng.randint(0, 5000)}", f"{rng.randint(200, 989)}-555-{rng.randint(0, 9999):04d}"]
+            written.append(row)
+        sheet.append(row)
+    workbook.save(path)
+
+
+def scenario_process_file(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="npi_bench_"), "roster.xlsx")
+    write_roster(path, args.rows)
+
+    def run():
+        return process_file(path, False, True, True, True, True, max_workers=args.workers).attrs["rows"]
+    return run
+
+
+def scenario_fetch_npi_data(args):
+    return lambda: len(fetch_npi_data("207Q00000X", "individual", args.page_size, args.workers))
+
+
+def scenario_parse_data(args):
+    pages = [synthetic_page(min(args.page_size, args.rows - start), seed=start) for start in range(0, args.rows, args.page_size)]
+    return lambda: sum(len(parse_data(page, "individual")) for page in pages)
+
+
+def scenario_extract_data(args):
+    responses = [npi_decode.decode_registry(stub_server.registry_response({"state": "CA", "limit": "200", "seed": str(i)}, 200))
+                 for i in range(max(1, args.rows // 200))]
+    return lambda: sum(len(extract_data(response)) for response in responses)
+
+
+def scenario_download_dataframe_as_excel(args):
+    rows = [record for start in range(0, args.rows, args.page_size)
+            for record in parse_data(synthetic_page(min(args.page_size, args.rows - start), seed=start), "individual")]
+    df = pd.DataFrame(rows)
+
+    def run():
+        download_dataframe_as_excel(df)
+        return len(df)
+    return run
+
+
+SCENARIOS = {
+    "process_file": scenario_process_file,
+    "fetch_npi_data": scenario_fetch_npi_data,
+    "parse_data": scenario_parse_data,
+    "extract_data": scenario_extract_data,
+    "download_dataframe_as_excel": scenario_download_dataframe_as_excel,
+}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+# Function to run one scenario `repeat` times and summarize it
+def run_scenario(name, args):
+    run = SCENARIOS[name](args)
+    metrics.reset()
+    durations, units = [], 0
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        units = run()
+        durations.append(time.perf_counter() - started)
+    snapshot = metrics.snapshot()
+    requests = sum(entry["requests"] for entry in snapshot["endpoints"].values())
+    latency = [entry["latency"] for entry in snapshot["endpoints"].values() if entry["latency"]["count"]]
+    median = statistics.median(durations)
+    return {
+        "scenario": name,
+        "units": units,
+        "throughput_per_s": units / median if median else 0.0,
+        "p50_s": percentile(durations, 0.50),
+        "p99_s": percentile(durations, 0.99),
+        "requests": requests // args.repeat,
+        "errors": sum(entry["errors"] for entry in snapshot["endpoints"].values()),
+        "retries": sum(entry["retries"] for entry in snapshot["endpoints"].values()),
+        "request_p50_s": max((h["p50"] for h in latency), default=0.0),
+        "request_p99_s": max((h["p99"] for h in latency), default=0.0),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--rows", type=int, default=2000, help="roster rows / records per scenario")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub mean latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub 429/503 share")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    server, base_url = stub_server.start(latency=args.latency, latency_jitter=args.latency / 5,
+                                         error_rate=args.error_rate, total_records={"*": args.rows})
+    use_stub(base_url, args.workers * 2)
+    results = []
+    try:
+        for name in args.scenarios or list(SCENARIOS):
+            result = run_scenario(name, args)
+            results.append(result)
+            print(f"{name:30s} {result['units']:>8} units  {result['throughput_per_s']:>10.1f}/s  "
+                  f"p50 {result['p50_s']:.3f}s  p99 {result['p99_s']:.3f}s  "
+                  f"requests {result['requests']} (p50<={result['request_p50_s']}s p99<={result['request_p99_s']}s)  "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Local stub of the NPPES registry API and the clinicaltables npi_idv/npi_org search endpoints.
+
+Responses are synthetic but deterministic (seeded by the query), with configurable
+latency and error rates, so benchmarks can run without touching the live services.
+
+    python -m benchmarks.stub_server --port 8765 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATES = ["CA", "NY", "TX", "FL", "IL", "PA", "OH", "GA"]
+CITIES = ["SPRINGFIELD", "RIVERSIDE", "FRANKLIN", "GREENVILLE", "BRISTOL", "CLINTON"]
+TAXONOMIES = [
+    ("207Q00000X", "Allopathic & Osteopathic Physicians", "Family Medicine", ""),
+    ("207R00000X", "Allopathic & Osteopathic Physicians", "Internal Medicine", ""),
+    ("208D00000X", "Allopathic & Osteopathic Physicians", "General Practice", ""),
+    ("363L00000X", "Physician Assistants & Advanced Practice Nursing Providers", "Nurse Practitioner", ""),
+    ("261QP2300X", "Ambulatory Health Care Facilities", "Clinic/Center", "Primary Care"),
+]
+
+
+# Function to seed a generator from the parts of a query, so repeated queries get identical answers
+def seeded(*parts):
+    return random.Random(int(hashlib.sha256(repr(parts).encode()).hexdigest()[:16], 16))
+
+
+def phone(rng):
+    return f"{rng.randint(200, 989)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+
+
+# Function to build one registry API result
+def registry_result(rng, number=None, first_name=None, last_name=None):
+    code, _, classification, _ = rng.choice(TAXONOMIES)
+    city, state = rng.choice(CITIES), rng.choice(STATES)
+    return {
+        "number": number or str(rng.randint(1000000000, 1999999999)),
+        "basic": {"first_name": first_name or f"FIRST{rng.randint(0, 999)}",
+                  "last_name": last_name or f"LAST{rng.randint(0, 999)}",
+                  "middle_name": rng.choice(["", "A", "J", "M"])},
+        "taxonomies": [{"code": code, "desc": classification, "primary": True, "license": f"L{rng.randint(0, 99999)}", "state": state}],
+        "addresses": [
+            {"address_purpose": "LOCATION", "address_1": f"{rng.randint(1, 9999)} MAIN ST", "address_2": "",
+             "city": city, "state": state, "postal_code": f"{rng.randint(10000, 99999)}", "country_name": "United States",
+             "telephone_number": phone(rng)},
+            {"address_purpose": "MAILING", "address_1": "PO BOX 1", "address_2": "", "city": city, "state": state,
+             "postal_code": f"{rng.randint(10000, 99999)}", "country_name": "United States", "telephone_number": phone(rng)},
+        ],
+        "endpoints": [{"endpoint": f"provider{rng.randint(0, 99999)}@direct.example.org"}] if rng.random() < 0.3 else [],
+    }
+
+
+# Function to answer a registry query: an NPI gives one result, names give 0-3, anything else a page
+def registry_response(query, max_results):
+    limit = int(query.get("limit", 10))
+    skip = int(query.get("skip", 0))
+    rng = seeded("registry", sorted(query.items()))
+    if query.get("number"):
+        results = [registry_result(rng, number=query["number"])]
+    elif query.get("first_name") or query.get("last_name"):
+        results = [registry_result(rng, first_name=query.get("first_name"), last_name=query.get("last_name"))
+                   for _ in range(rng.choice([0, 1, 1, 1, 2, 3]))]
+    else:
+        total = max(0, min(max_results - skip, limit))
+        results = [registry_result(seeded("registry", sorted(query.items()), i)) for i in range(total)]
+    return {"result_count": len(results), "results": results}
+
+
+# Function to build a clinicaltables page: [total, codes, {field: column}, display]
+def clinicaltables_response(table, query, total_records):
+    offset = int(query.get("offset", 0))
+    count = int(query.get("count", 7))
+    code = query.get("q", "").rsplit(":", 1)[-1]
+    total = total_records.get(code, total_records.get("*", 0))
+    rows = range(offset, min(offset + count, total))
+    columns = {field: [] for field in query.get("ef", "").split(",") if field}
+    for i in rows:
+        rng = seeded(table, code, i)
+        licenses = [{"taxonomy": {"code": c, "grouping": g, "classification": cl, "specialization": s},
+                     "is_primary_taxonomy": rng.choice(["Y", "N", "X"])}
+                    for c, g, cl, s in rng.sample(TAXONOMIES, rng.randint(1, 3))]
+        values = {
+            "NPI": str(1000000000 + i), "provider_type": licenses[0]["taxonomy"]["classification"],
+            "name.full": f"PROVIDER {table.upper()} {i}", "addr_practice.full": f"{i} MAIN ST",
+            "licenses": licenses, "name.credential": rng.choice(["MD", "DO", "NP", ""]),
+            "addr_practice.city": rng.choice(CITIES), "addr_practice.state": rng.choice(STATES),
+            "addr_practice.zip": f"{rng.randint(10000, 99999)}", "addr_practice.phone": phone(rng),
+            "addr_practice.country": "US",
+        }
+        for field in columns:
+            columns[field].append(values.get(field))
+    return [total, columns.get("NPI", []), columns, [[npi] for npi in columns.get("NPI", [])]]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40 ms to each keep-alive reply
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        config = self.server.config
+        time.sleep(max(0.0, random.gauss(config["latency"], config["latency_jitter"])))
+        if random.random() < config["error_rate"]:
+            return self.reply(random.choice([429, 503]), {"error": "stub error"})
+
+        parsed = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query, keep_blank_values=True).items()}
+        parts = [part for part in parsed.path.split("/") if part]
+        if parts == ["api"]:
+            return self.reply(200, registry_response(query, config["registry_max_results"]))
+        if len(parts) == 4 and parts[0] == "api" and parts[1] in ("npi_idv", "npi_org") and parts[3] == "search":
+            return self.reply(200, clinicaltables_response(parts[1], query, config["total_records"]))
+        return self.reply(404, {"error": "not found"})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Function to start the stub in a background thread; returns (server, base_url)
+def start(port=0, latency=0.05, latency_jitter=0.01, error_rate=0.0, total_records=None, registry_max_results=200):
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.config = {
+        "latency": latency,
+        "latency_jitter": latency_jitter,
+        "error_rate": error_rate,
+        "total_records": total_records or {"*": 5000},
+        "registry_max_results": registry_max_results,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response delay in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429/503")
+    parser.add_argument("--total-records", type=int, default=5000, help="records per taxonomy code")
+    args = parser.parse_args()
+    server, base_url = start(args.port, args.latency, args.latency_jitter, args.error_rate, {"*": args.total_records})
+    print(f"Stub NPPES API at {base_url}/api/ and clinicaltables at {base_url}/api/npi_idv/v3/search")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
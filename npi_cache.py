@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+from npi_decode import loads
+from npi_metrics import endpoint_name, metrics
+
+# Cache settings, overridable through the environment
+CACHE_PATH = os.environ.get("NPI_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".npi_cache.sqlite"))
+CACHE_TTL = float(os.environ.get("NPI_CACHE_TTL", 7 * 24 * 3600))  # seconds
+CACHE_MAX_ENTRIES = int(os.environ.get("NPI_CACHE_MAX_ENTRIES", 500000))
+CACHE_MAX_BYTES = int(os.environ.get("NPI_CACHE_MAX_BYTES", 2 * 2**30))  # total size of the cached bodies
+
+# Eviction trims the cache to this fraction of its caps, so it doesn't run again on the next insert
+EVICT_TO = 0.9
+
+# "on" reads and writes the cache, "off" bypasses it, "only" never touches the network
+CACHE_MODES = ("on", "off", "only")
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMiss(requests.exceptions.RequestException):
+    """Raised in cache-only mode when a query has no fresh cached response."""
+
+
+# Function to build a stable cache key from a URL and its query parameters
+def make_key(url, params):
+    normalized = sorted((str(k), str(v).strip()) for k, v in (params or {}).items())
+    return json.dumps([url, normalized], separators=(",", ":"))
+
+
+class ResponseCache:
+    """SQLite-backed JSON response cache with TTL, LRU entry and byte caps and hit/miss counters.
+
+    `mode` is the default for lookups; get_or_fetch takes a per-call mode so one Streamlit
+    session going cache-only doesn't change what another session's jobs do. Entry and byte
+    totals are counted once on connect and then kept up to date by put/evict.
+
+    SQLite errors never reach callers: if the database can't be opened the cache is bypassed
+    (lookups go straight to the APIs) and `error` says why; a failed read or write is skipped.
+    Either is logged once."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, mode=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.mode = mode or os.environ.get("NPI_CACHE_MODE", "on")
+        self.hits = 0
+        self.misses = 0
+        self.entries = 0
+        self.bytes = 0
+        self.error = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, body TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self.entries, self.bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(body AS BLOB))), 0) FROM responses").fetchone()
+        return self._conn
+
+    # Function to get the connection, or None when the database can't be opened (the cache is then bypassed)
+    def _db(self):
+        if self._conn is None and not self._unavailable:
+            try:
+                self._connect()
+            except sqlite3.Error as e:
+                self._unavailable = True
+                self._failed("open", e)
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+        return self._conn
+
+    # Function to record a database error, logging only the first one
+    def _failed(self, action, error):
+        if self.error is None:
+            logger.warning("Response cache %s: could not %s (%s); calling the APIs directly", self.path, action, error)
+        self.error = f"could not {action} {self.path}: {error}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                self.misses += 1
+                return None
+            try:
+                row = conn.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None or (self.ttl and now - row[1] > self.ttl):
+                    self.misses += 1
+                    return None
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                conn.commit()
+            except sqlite3.Error as e:
+                self._failed("read", e)
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key, body):
+        now = time.time()
+        size = len(body.encode("utf-8")) if isinstance(body, str) else len(body)
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            # Totals are only updated once the transaction has committed
+            try:
+                old = conn.execute("SELECT LENGTH(CAST(body AS BLOB)) FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, body, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, body, now, now),
+                )
+                entries = self.entries + (old is None)
+                total = self.bytes - (old[0] if old else 0) + size
+                if (self.max_entries and entries > self.max_entries) or (self.max_bytes and total > self.max_bytes):
+                    entries, total = self._evict(conn, entries, total)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                self._failed("write", e)
+                return
+            self.entries, self.bytes = entries, total
+
+    # Function to delete least recently used entries until both totals are under EVICT_TO of their caps;
+    # returns the totals left
+    def _evict(self, conn, entries, total):
+        max_entries = int(self.max_entries * EVICT_TO) if self.max_entries else None
+        max_bytes = int(self.max_bytes * EVICT_TO) if self.max_bytes else None
+        rows = conn.execute("SELECT key, LENGTH(CAST(body AS BLOB)) FROM responses ORDER BY accessed")
+        evicted = []
+        for key, size in rows:
+            if (max_entries is None or entries <= max_entries) and (max_bytes is None or total <= max_bytes):
+                break
+            evicted.append((key,))
+            entries -= 1
+            total -= size
+        rows.close()
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        return entries, total
+
+    def clear(self):
+        with self._lock:
+            conn = self._db()
+            if conn is not None:
+                try:
+                    conn.execute("DELETE FROM responses")
+                    conn.commit()
+                except sqlite3.Error as e:
+                    self._failed("clear", e)
+                    return
+            self.hits = 0
+            self.misses = 0
+            self.entries = 0
+            self.bytes = 0
+
+    def stats(self):
+        # With the cache off by default the database is left closed until a session turns it on
+        if self.mode != "off":
+            with self._lock:
+                self._db()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "error": self.error,
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    # Function to return a decoded JSON body, cached or from fetch() (whose text is then stored);
+    # the raw text is what gets cached, so changing `decode` never invalidates entries.
+    # mode overrides the cache's default mode for this call
+    def get_or_fetch(self, url, params, fetch, decode=loads, mode=None):
+        mode = mode or self.mode
+        if mode == "off":
+            return decode(fetch())
+        key = make_key(url, params)
+        cached = self.get(key)
+        metrics.count(endpoint_name(url), "cache_hits" if cached is not None else "cache_misses")
+        if cached is not None:
+            return decode(cached)
+        if mode == "only":
+            reason = f" (cache unavailable: {self.error})" if self._unavailable else ""
+            raise CacheMiss(f"No cached response for {url} {params}{reason}")
+        body = fetch()
+        data = decode(body)
+        self.put(key, body)
+        return data
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide response cache
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
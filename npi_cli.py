@@ -0,0 +1,239 @@
+"""Headless batch runner for Match NPI and Extract NPI Data, with checkpoint/resume.
+
+    python -m npi_cli match roster.xlsx matched.csv --npi --first-name --last-name --phone
+    python -m npi_cli extract extract.csv 207Q00000X 208D00000X --entity all
+
+Progress is checkpointed after every Match chunk and every Extract page. Re-running the
+same command after a crash resumes from the last completed chunk or page. A lookup or page
+that still fails after retries is never checkpointed: the run exits non-zero and a re-run
+retries it. Extract combines taxonomy codes into OR queries (--batch-size) and writes each
+provider once.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+import npi_export
+import npi_input
+import npi_scoring
+from streamlit_app import (DEFAULT_MATCH_WORKERS, DEFAULT_PAGE_WORKERS, EXTRACT_OUTPUT_COLUMNS, MAX_PAGE_SIZE,
+                           TAXONOMY_BATCH_SIZE, BACKENDS, PageFetchError, drop_seen, iter_npi_pages, match_dataframe,
+                           npi_key, plan_taxonomy_batches)
+
+DEFAULT_CHUNK_SIZE = 500
+
+ENTITY_TYPES = {"individual": ["individual"], "organization": ["organization"], "all": ["individual", "organization"]}
+
+
+# Function to fingerprint a job so a checkpoint is only resumed for the same input and options
+def job_fingerprint(options, input_path=None):
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    if input_path:
+        with open(input_path, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """JSON progress file, replaced atomically after every completed unit of work."""
+
+    def __init__(self, directory, fingerprint, restart=False):
+        self.directory = directory
+        self.path = os.path.join(directory, "checkpoint.json")
+        if restart and os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.state = {"fingerprint": fingerprint}
+        if os.path.exists(self.path):
+            with open(self.path) as handle:
+                state = json.load(handle)
+            if state.get("fingerprint") != fingerprint:
+                raise SystemExit(f"{self.path} belongs to a different input or options; use --restart to discard it")
+            self.state = state
+
+    def save(self, **updates):
+        self.state.update(updates)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump(self.state, handle)
+        os.replace(tmp_path, self.path)
+
+
+# Function to write a DataFrame in the format given by the file extension (.xlsx, .csv.gz, .parquet or .csv)
+def write_frame(df, path):
+    npi_export.export_dataframe(df, npi_export.format_for_path(path), path)
+
+
+def run_match(args):
+    options = {key: getattr(args, key) for key in ("npi", "first_name", "last_name", "phone", "area_code",
+                                                    "chunk_size", "backend", "score", "min_score", "min_margin")}
+    checkpoint = Checkpoint(args.checkpoint_dir or args.output + ".checkpoint",
+                            job_fingerprint(options, args.input), args.restart)
+    done = set(checkpoint.state.get("chunks_done", []))
+    print(f"{len(done)} chunks already done", file=sys.stderr)
+
+    # Chunks stream from the input; finished ones are read but not re-matched.
+    # Responses are shared between the chunks of this run, so a repeated query is sent once
+    shared = {}
+    chunks = 0
+    failed = []
+    for number, chunk in enumerate(npi_input.iter_input_batches(args.input, args.chunk_size)):
+        chunks += 1
+        if number in done:
+            continue
+        result_df = match_dataframe(chunk, args.npi, args.first_name, args.last_name,
+                                    args.phone, args.area_code, args.workers, args.backend,
+                                    args.score, args.min_score, args.min_margin, shared_responses=shared)
+        # A chunk with lookups that still failed after retries is left undone, so a re-run retries it
+        if result_df.attrs["failed_lookups"]:
+            failed.append(number)
+            print(f"chunk {number + 1}: {result_df.attrs['failed_lookups']} lookups failed; not checkpointed",
+                  file=sys.stderr)
+            continue
+        result_df.to_pickle(os.path.join(checkpoint.directory, f"chunk_{number:06d}.pkl"))
+        done.add(number)
+        checkpoint.save(chunks_done=sorted(done))
+        print(f"chunk {number + 1}: {result_df.attrs['rows']} rows, "
+              f"{result_df.attrs['rows_per_second']:.1f} rows/s, {result_df.attrs['calls_saved']} calls saved",
+              file=sys.stderr)
+
+    if failed:
+        raise SystemExit(f"{len(failed)} of {chunks} chunks had failed lookups and were not written; "
+                         f"re-run the same command to retry them")
+    parts = [pd.read_pickle(os.path.join(checkpoint.directory, f"chunk_{number:06d}.pkl")) for number in range(chunks)]
+    write_frame(pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(), args.output)
+    print(f"Wrote {args.output}", file=sys.stderr)
+    if not args.keep_checkpoint:
+        shutil.rmtree(checkpoint.directory)
+
+
+# Function to copy the CSV spool into the output file's format, one chunk of rows at a time
+def convert_spool(spool_path, output, fmt):
+    with open(spool_path, newline="", encoding="utf-8") as handle, \
+            npi_export.Exporter(fmt, EXTRACT_OUTPUT_COLUMNS, output) as exporter:
+        rows = []
+        for row in csv.DictReader(handle):
+            rows.append(row)
+            if len(rows) >= npi_export.EXPORT_CHUNK_ROWS:
+                exporter.write_records(rows)
+                rows = []
+        exporter.write_records(rows)
+
+
+# Function to rebuild the NPI seen-set from an extract CSV already truncated to its last checkpoint
+def read_seen_npis(path, output_bytes):
+    seen = set()
+    if output_bytes:
+        with open(path, newline="", encoding="utf-8") as handle:
+            seen.update(npi_key(row["NPI"]) for row in csv.DictReader(handle))
+    return seen
+
+
+def run_extract(args):
+    args.page_size = max(1, min(args.page_size, MAX_PAGE_SIZE))
+    codes = list(dict.fromkeys(args.taxonomy_codes))
+    pairs = [(batch, entity) for batch in plan_taxonomy_batches(codes, args.batch_size) for entity in ENTITY_TYPES[args.entity]]
+    options = {"pairs": pairs, "page_size": args.page_size}
+    checkpoint = Checkpoint(args.checkpoint_dir or args.output + ".checkpoint", job_fingerprint(options), args.restart)
+    pair_index = checkpoint.state.get("pair_index", 0)
+    pages_done = checkpoint.state.get("pages_done", 0)
+
+    # Pages are checkpointed as CSV; other output formats are spooled beside the checkpoint and converted at the end
+    fmt = npi_export.format_for_path(args.output)
+    spool_path = args.output if fmt == "csv" else os.path.join(checkpoint.directory, "extract.csv")
+
+    # Drop anything written after the last checkpointed page
+    output_bytes = checkpoint.state.get("output_bytes", 0)
+    mode = "r+" if output_bytes and os.path.exists(spool_path) else "w"
+    with open(spool_path, mode, newline="", encoding="utf-8") as handle:
+        handle.truncate(output_bytes)
+        handle.seek(output_bytes)
+        writer = csv.writer(handle)
+        if not output_bytes:
+            writer.writerow(EXTRACT_OUTPUT_COLUMNS)
+        seen = read_seen_npis(spool_path, output_bytes)
+
+        for index in range(pair_index, len(pairs)):
+            batch, entity_type = pairs[index]
+            start_offset = pages_done * args.page_size if index == pair_index else 0
+            page_number = start_offset // args.page_size
+            records = 0
+            started = time.perf_counter()
+            pages = iter_npi_pages(batch, entity_type, args.page_size, args.workers, start_offset, requested_codes=codes,
+                                   strict=True)
+            try:
+                for page in pages:
+                    page = drop_seen(page, seen)
+                    if page:
+                        writer.writerows(zip(*(page[column] for column in EXTRACT_OUTPUT_COLUMNS)))
+                        records += len(page["NPI"])
+                    handle.flush()
+                    page_number += 1
+                    checkpoint.save(pair_index=index, pages_done=page_number, output_bytes=handle.tell())
+            except PageFetchError as e:
+                # The checkpoint stays at the last page written, so a re-run fetches the failed page again
+                raise SystemExit(f"{e}\nStopped after {page_number} pages of {', '.join(batch)} {entity_type}; "
+                                 f"re-run the same command to resume") from e
+            checkpoint.save(pair_index=index + 1, pages_done=0, output_bytes=handle.tell())
+            print(f"{', '.join(batch)} {entity_type}: {records} new records in {time.perf_counter() - started:.1f}s",
+                  file=sys.stderr)
+
+    if fmt != "csv":
+        convert_spool(spool_path, args.output, fmt)
+    print(f"Wrote {args.output}", file=sys.stderr)
+    if not args.keep_checkpoint:
+        shutil.rmtree(checkpoint.directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--checkpoint-dir", help="defaults to <output>.checkpoint")
+    common.add_argument("--restart", action="store_true", help="discard any existing checkpoint")
+    common.add_argument("--keep-checkpoint", action="store_true", help="keep the checkpoint directory after success")
+
+    match = commands.add_parser("match", parents=[common], help="match a roster against the registry")
+    match.add_argument("input", help="xlsx, csv or parquet file with NPI, First Name, Last Name and/or Phone columns")
+    match.add_argument("output", help=".csv, .csv.gz, .xlsx or .parquet")
+    match.add_argument("--npi", action="store_true", help="match by NPI")
+    match.add_argument("--first-name", action="store_true", help="match by First Name")
+    match.add_argument("--last-name", action="store_true", help="match by Last Name")
+    match.add_argument("--phone", action="store_true", help="filter multiple results by Phone")
+    match.add_argument("--area-code", action="store_true", help="fall back to the phone area code")
+    match.add_argument("--score", action="store_true", help="score ambiguous matches instead of skipping them")
+    match.add_argument("--min-score", type=float, default=npi_scoring.MIN_SCORE)
+    match.add_argument("--min-margin", type=float, default=npi_scoring.MIN_MARGIN)
+    match.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    match.add_argument("--workers", type=int, default=DEFAULT_MATCH_WORKERS)
+    match.add_argument("--backend", choices=BACKENDS, default="api")
+
+    extract = commands.add_parser("extract", parents=[common], help="extract providers by taxonomy code to a file")
+    extract.add_argument("output", help=".csv, .csv.gz, .xlsx or .parquet")
+    extract.add_argument("taxonomy_codes", nargs="+")
+    extract.add_argument("--entity", choices=sorted(ENTITY_TYPES), default="all")
+    extract.add_argument("--page-size", type=int, default=MAX_PAGE_SIZE)
+    extract.add_argument("--workers", type=int, default=DEFAULT_PAGE_WORKERS)
+    extract.add_argument("--batch-size", type=int, default=TAXONOMY_BATCH_SIZE, help="taxonomy codes combined per query")
+
+    args = parser.parse_args(argv)
+    # Warnings from the lookups (e.g. a failed request) go to stderr
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+    if args.command == "match":
+        run_match(args)
+    else:
+        run_extract(args)
+
+
+if __name__ == "__main__":
+    main()
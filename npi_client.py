@@ -0,0 +1,120 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import npi_cache
+import npi_decode
+import npi_ratelimit
+from npi_metrics import endpoint_name, metrics
+
+NPPES_URL = "https://npiregistry.cms.hhs.gov/api/"
+CLINICALTABLES_URL = "https://clinicaltables.nlm.nih.gov/api/"
+
+# Connection pool size per host; sized for the Match/Extract worker pools
+POOL_SIZES = {
+    "https://npiregistry.cms.hhs.gov": 32,
+    "https://clinicaltables.nlm.nih.gov": 32,
+}
+DEFAULT_POOL_SIZE = 10
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 30)
+
+# Retry policy for throttling and server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Function to build a session with one keep-alive pool per host
+def _build_session():
+    session = requests.Session()
+    for prefix, pool_size in POOL_SIZES.items():
+        session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    session.mount("https://", HTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE))
+    return session
+
+
+# Function to drop the shared session so the next call rebuilds it (e.g. after changing POOL_SIZES)
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+# Function to get the process-wide shared session
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+# Function to compute the sleep before retry number `attempt` (full jitter)
+def backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+# Function to GET a URL through the shared session, retrying 429/5xx and connection errors
+def get(url, params=None, timeout=TIMEOUT, max_retries=MAX_RETRIES):
+    session = get_session()
+    endpoint = endpoint_name(url)
+    attempt = 0
+    while True:
+        queued = time.perf_counter()
+        try:
+            # Shared per-host token bucket and AIMD concurrency limit
+            with npi_ratelimit.get_limiter(url).slot() as report:
+                # Latency is timed from here, so waiting for a slot is recorded separately
+                started = time.perf_counter()
+                metrics.observe_stage("rate_limit_wait", started - queued)
+                response = session.get(url, params=params, timeout=timeout)
+                size = len(response.content) if response.status_code not in RETRY_STATUSES else 0
+                report(response.status_code)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            metrics.observe_request(endpoint, time.perf_counter() - started)
+            if attempt >= max_retries:
+                metrics.count(endpoint, "errors")
+                raise
+            metrics.count(endpoint, "retries")
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        metrics.observe_request(endpoint, time.perf_counter() - started, size)
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            response.close()
+            metrics.count(endpoint, "retries")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        if not response.ok:
+            metrics.count(endpoint, "errors")
+        response.raise_for_status()  # Raises an error for bad status codes
+        return response
+
+
+# Function to GET a URL and decode the JSON body, served from the response cache when possible;
+# decode turns the body text into the result (npi_decode.loads by default), cache_mode overrides
+# the cache's default mode ("on", "off" or "only") for this request
+def get_json(url, params=None, decode=npi_decode.loads, cache_mode=None, **kwargs):
+    return npi_cache.get_cache().get_or_fetch(url, params, lambda: get(url, params=params, **kwargs).text, decode,
+                                              cache_mode)
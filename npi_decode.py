@@ -0,0 +1,87 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library decoder is used instead
+    orjson = None
+
+# Fastest available JSON decoder (both accept str or bytes and raise ValueError subclasses)
+DECODER = "orjson" if orjson is not None else "json"
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class Taxonomy:
+    """The registry taxonomy fields extract_data and scoring read."""
+
+    __slots__ = ("code", "desc", "license", "primary")
+
+    def __init__(self, code, desc, license, primary):
+        self.code = code
+        self.desc = desc
+        self.license = license
+        self.primary = primary
+
+
+class Address:
+    """The registry address fields used for output, phone filtering and scoring."""
+
+    __slots__ = ("address_1", "address_2", "city", "state", "postal_code", "country_name", "telephone_number")
+
+    def __init__(self, address_1, address_2, city, state, postal_code, country_name, telephone_number):
+        self.address_1 = address_1
+        self.address_2 = address_2
+        self.city = city
+        self.state = state
+        self.postal_code = postal_code
+        self.country_name = country_name
+        self.telephone_number = telephone_number
+
+
+class Provider:
+    """One registry result, reduced to the fields the app reads; endpoints are the endpoint strings."""
+
+    __slots__ = ("number", "first_name", "middle_name", "last_name", "taxonomies", "addresses", "endpoints")
+
+    def __init__(self, number, first_name, middle_name, last_name, taxonomies, addresses, endpoints):
+        self.number = number
+        self.first_name = first_name
+        self.middle_name = middle_name
+        self.last_name = last_name
+        self.taxonomies = taxonomies
+        self.addresses = addresses
+        self.endpoints = endpoints
+
+
+# Function to project one registry result onto a Provider (same defaults as the old .get() chains)
+def decode_provider(result):
+    basic = result.get("basic", {})
+    return Provider(
+        result.get("number", ""),
+        basic.get("first_name", ""),
+        basic.get("middle_name", ""),
+        basic.get("last_name", ""),
+        tuple(Taxonomy(taxonomy.get("code", ""), taxonomy.get("desc", ""), taxonomy.get("license", ""),
+                       taxonomy.get("primary", False))
+              for taxonomy in result.get("taxonomies", [])),
+        tuple(Address(address.get("address_1", ""), address.get("address_2", ""), address.get("city", ""),
+                      address.get("state", ""), address.get("postal_code", ""), address.get("country_name", ""),
+                      address.get("telephone_number", ""))
+              for address in result.get("addresses", [])),
+        tuple(endpoint.get("endpoint", "") for endpoint in result.get("endpoints", [])),
+    )
+
+
+# Function to project a decoded registry response: {"result_count": n, "results": [Provider, ...]};
+# the full payload (identifiers, other names, practice locations...) is dropped right away
+def decode_registry(data):
+    if not isinstance(data, dict):
+        raise ValueError(f"Unexpected registry response: {type(data).__name__}")
+    return {
+        "result_count": data.get("result_count", 0),
+        "results": [decode_provider(result) for result in data.get("results", [])],
+    }
+
+
+# Function to decode a registry response body straight into Provider records
+def registry_from_json(body):
+    return decode_registry(loads(body))
@@ -0,0 +1,183 @@
+import csv
+import gzip
+import os
+import tempfile
+
+import xlsxwriter
+
+from npi_metrics import metrics
+
+# Excel's sheet limit is 1,048,576 rows, one of which is the header
+EXCEL_MAX_ROWS = 1048576
+
+# Rows handed to a writer at a time when exporting a DataFrame
+EXPORT_CHUNK_ROWS = 50000
+
+
+# Function to turn missing values (None, NaN, pd.NA) into an empty cell
+def _cell(value):
+    try:
+        return None if value is None or value != value else value
+    except TypeError:  # pd.NA refuses boolean comparison
+        return None
+
+
+class CsvWriter:
+    """Plain or gzip-compressed CSV, written row by row."""
+
+    def __init__(self, path, columns, compress=False):
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self.handle = gzip.open(path, "wt", newline="", encoding="utf-8") if compress else open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.handle)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+
+    def close(self):
+        self.handle.close()
+
+
+class XlsxWriter:
+    """xlsx in constant_memory mode: each row is flushed as it is written, and a new sheet
+    is started whenever the current one reaches Excel's row limit."""
+
+    def __init__(self, path, columns, max_rows=EXCEL_MAX_ROWS):
+        self.path = path
+        self.columns = columns
+        self.max_rows = max_rows
+        self.rows = 0
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+        self.worksheet = None
+        self.sheet_row = 0
+
+    def _new_sheet(self):
+        sheet_number = len(self.workbook.worksheets()) + 1
+        self.worksheet = self.workbook.add_worksheet("Sheet1" if sheet_number == 1 else f"Sheet{sheet_number}")
+        self.worksheet.write_row(0, 0, self.columns)
+        self.sheet_row = 0
+
+    def write_rows(self, rows):
+        for row in rows:
+            if self.worksheet is None or self.sheet_row >= self.max_rows - 1:
+                self._new_sheet()
+            self.sheet_row += 1
+            self.worksheet.write_row(self.sheet_row, 0, row)
+        self.rows += len(rows)
+
+    def close(self):
+        if self.worksheet is None:
+            self._new_sheet()
+        self.workbook.close()
+
+
+class ParquetWriter:
+    """Parquet with one row group per write (needs pyarrow); values are stored as strings."""
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from e
+        self.pa = pa
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self.schema = pa.schema([(column, pa.string()) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        arrays = [
+            self.pa.array([None if _cell(value) is None else str(value) for value in column], type=self.pa.string())
+            for column in zip(*rows)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        self.writer.close()
+
+
+# Export format: (writer factory, file extension, download mime type)
+FORMATS = {
+    "xlsx": (XlsxWriter, ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv.gz": (lambda path, columns: CsvWriter(path, columns, compress=True), ".csv.gz", "application/gzip"),
+    "csv": (CsvWriter, ".csv", "text/csv"),
+    "parquet": (ParquetWriter, ".parquet", "application/vnd.apache.parquet"),
+}
+
+
+# Function to pick a format from a file name's extension (defaults to csv)
+def format_for_path(path):
+    lowered = path.lower()
+    for fmt, (_, extension, _) in sorted(FORMATS.items(), key=lambda item: -len(item[1][1])):
+        if lowered.endswith(extension):
+            return fmt
+    return "csv"
+
+
+class Exporter:
+    """Incremental export to a file (a fresh temp file when no path is given).
+
+    Accepts pages of record dicts, rows or DataFrame chunks, so nothing beyond one page
+    has to be held in memory."""
+
+    def __init__(self, fmt, columns, path=None):
+        factory, extension, self.mime = FORMATS[fmt]
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix=extension, prefix="npi_export_")
+            os.close(fd)
+        self.fmt = fmt
+        self.path = path
+        self.columns = list(columns)
+        self.extension = extension
+        self.writer = factory(path, self.columns)
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def write_records(self, records):
+        with metrics.timed("export"):
+            self.writer.write_rows([[record.get(column) for column in self.columns] for record in records])
+
+    # Function to write rows that are already in column order
+    def write_rows(self, rows):
+        with metrics.timed("export"):
+            self.writer.write_rows(rows)
+
+    def write_frame(self, df):
+        with metrics.timed("export"):
+            for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+                chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+                self.writer.write_rows([
+                    [_cell(value) for value in row]
+                    for row in chunk[self.columns].itertuples(index=False, name=None)
+                ])
+
+    def close(self):
+        with metrics.timed("export"):
+            self.writer.close()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Function to export a whole DataFrame to a file; returns the path
+def export_dataframe(df, fmt, path=None):
+    with Exporter(fmt, [str(column) for column in df.columns], path) as exporter:
+        # set_axis copies the frame, so only rename when some column label is not already a string
+        if list(df.columns) != exporter.columns:
+            df = df.set_axis(exporter.columns, axis=1)
+        exporter.write_frame(df)
+    return exporter.path
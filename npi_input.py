@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+
+# Rows per batch handed to the matcher
+DEFAULT_BATCH_SIZE = 5000
+
+# Upload formats accepted by Match NPI
+INPUT_TYPES = ["xlsx", "csv", "parquet"]
+
+
+# Function to turn an NPI cell into a clean string ("" when missing, no ".0" from float columns)
+def clean_npi(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    value = str(value).strip()
+    return value[:-2] if value.endswith(".0") and value[:-2].isdigit() else value
+
+
+# Function to turn a Phone cell into a clean string ("" when missing)
+def clean_phone(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+# Function to normalize the NPI and Phone columns of a batch once, up front
+def normalize_batch(df):
+    if 'NPI' in df.columns:
+        df['NPI'] = df['NPI'].map(clean_npi).astype(object)
+    if 'Phone' in df.columns:
+        df['Phone'] = df['Phone'].map(clean_phone).astype(object)
+    return df
+
+
+# Function to work out the input format from a path or an uploaded file's name
+def input_format(source, file_name=None):
+    name = file_name or (source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", ""))
+    extension = os.path.splitext(str(name))[1].lower().lstrip(".")
+    if extension not in INPUT_TYPES:
+        raise ValueError(f"Unsupported input type '{extension}'; expected one of {', '.join(INPUT_TYPES)}")
+    return extension
+
+
+# Function to read an Excel sheet in read-only mode, one batch at a time
+def _iter_excel(source, batch_size):
+    import openpyxl
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+        batch = []
+        for row in rows:
+            # Read-only mode yields trailing fully empty rows for formatted but blank cells
+            if all(cell is None for cell in row):
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+# Function to read a Parquet file one row group slice at a time (needs pyarrow)
+def _iter_parquet(source, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet input requires pyarrow (pip install pyarrow)") from e
+    for record_batch in pq.ParquetFile(source).iter_batches(batch_size=batch_size):
+        yield record_batch.to_pandas()
+
+
+# Function to yield normalized DataFrame batches from an xlsx, csv or parquet input
+def iter_input_batches(source, batch_size=DEFAULT_BATCH_SIZE, file_name=None):
+    fmt = input_format(source, file_name)
+    if fmt == "xlsx":
+        batches = _iter_excel(source, batch_size)
+    elif fmt == "csv":
+        batches = pd.read_csv(source, dtype={'NPI': str, 'Phone': str}, chunksize=batch_size)
+    else:
+        batches = _iter_parquet(source, batch_size)
+    for batch in batches:
+        yield normalize_batch(batch.reset_index(drop=True))
+
+
+# Function to read a whole input into one normalized DataFrame
+def read_input(source, file_name=None):
+    batches = list(iter_input_batches(source, file_name=file_name))
+    if not batches:
+        return pd.DataFrame()
+    return pd.concat(batches, ignore_index=True)
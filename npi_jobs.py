@@ -0,0 +1,225 @@
+import csv
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import npi_export
+from npi_metrics import metrics
+
+# Jobs running at once for the whole process; further jobs wait in the executor's queue
+MAX_RUNNING_JOBS = int(os.environ.get("NPI_MAX_JOBS", 4))
+
+# Finished jobs (and their files) are dropped this many seconds after they end
+JOB_RETENTION = float(os.environ.get("NPI_JOB_RETENTION", 6 * 3600))
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class Job:
+    """One background Match or Extract run.
+
+    Rows (record dicts or column pages) are appended to a CSV spool as they arrive (so a partial
+    download is always available), when export_format is set to an npi_export.Exporter for the
+    final file, and when a store (npi_store.ResultStore) is given to it, for in-memory filtering
+    and sorting.
+    The job function reports progress and checks `cancelled` between units of work."""
+
+    def __init__(self, kind, export_format=None, preview_rows=None, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.export_format = export_format
+        self.preview_rows = preview_rows
+        self.store = store
+        self.status = "queued"
+        self.error = None
+        self.warnings = []
+        self.done = 0
+        self.total = None
+        self.rows = 0
+        self.columns = None
+        self.preview = []
+        self.stats = {}
+        self.submitted = time.time()
+        self.started = None
+        self.first_result = None
+        self.finished = None
+        self.spool_path = None
+        self.export_path = None
+        self.exports = {}
+        self._spool = None
+        self._spool_writer = None
+        self._exporter = None
+        self._discarded = False
+        self._removed = False
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def is_finished(self):
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self, done, total=None):
+        self.done = done
+        if total is not None:
+            self.total = total
+
+    def warn(self, message):
+        with self._lock:
+            self.warnings.append(message)
+
+    # Function to persist a batch of result rows; the first batch fixes the columns
+    def add_rows(self, records, columns=None):
+        if not records:
+            return
+        columns = self.columns or list(columns or records[0].keys())
+        self.add_columns({column: [record.get(column) for record in records] for column in columns}, columns)
+
+    # Function to persist a page given as {column: list of values}; the first page fixes the columns
+    def add_columns(self, page, columns=None):
+        count = len(next(iter(page.values()), ()))
+        if not count:
+            return
+        with self._lock:
+            if self._spool_writer is None:
+                self.columns = list(columns or page)
+                fd, self.spool_path = tempfile.mkstemp(suffix=".csv", prefix=f"npi_{self.kind}_")
+                self._spool = os.fdopen(fd, "w", newline="", encoding="utf-8")
+                self._spool_writer = csv.writer(self._spool)
+                self._spool_writer.writerow(self.columns)
+                if self.export_format:
+                    self._exporter = npi_export.Exporter(self.export_format, self.columns)
+                self.first_result = time.time()
+            page = {column: page.get(column) or [None] * count for column in self.columns}
+            rows = list(zip(*page.values()))
+            self._spool_writer.writerows(rows)
+            self._spool.flush()
+            if self._exporter is not None:
+                self._exporter.write_rows(rows)
+            if self.store is not None:
+                self.store.append_columns(page)
+            self.rows += count
+            room = count if self.preview_rows is None else self.preview_rows - len(self.preview)
+            self.preview.extend(dict(zip(self.columns, row)) for row in rows[:max(0, room)])
+
+    # Function to read the rows persisted so far as CSV bytes
+    def partial_csv(self):
+        with self._lock:
+            if self.spool_path is None:
+                return b""
+            with open(self.spool_path, "rb") as spool:
+                return spool.read()
+
+    def _close(self):
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+            if self._exporter is not None:
+                self.export_path = self._exporter.close()
+
+    # Function to keep a file exported from the job's results in another format, so it is
+    # removed with the job's own files; returns the path
+    def add_export(self, fmt, path):
+        with self._lock:
+            self.exports[fmt] = path
+            removed = self._removed
+        if removed:
+            self.remove_files()
+        return path
+
+    def remove_files(self):
+        with self._lock:
+            self._removed = True
+            paths = [self.spool_path, self.export_path, *self.exports.values()]
+        for path in paths:
+            try:
+                if path:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobRunner:
+    """Process-wide worker pool shared by every Streamlit session."""
+
+    def __init__(self, max_workers=MAX_RUNNING_JOBS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="npi-job")
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    # Function to queue fn(job, *args, **kwargs) on the pool; returns the job
+    def submit(self, job, fn, *args, **kwargs):
+        self.prune()
+        with self._lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started = time.time()
+        status = "cancelled"
+        try:
+            if not job.cancelled:
+                job.status = "running"
+                fn(job, *args, **kwargs)
+                status = "cancelled" if job.cancelled else "done"
+        except Exception as e:
+            status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            # Files are complete before the job reports a finished state
+            job._close()
+            job.finished = time.time()
+            job.status = status
+            metrics.observe_stage(f"job_{job.kind}", job.finished - job.started)
+            if job._discarded:
+                job.remove_files()
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    # Function to cancel a job and forget it; its files go once it has stopped
+    def discard(self, job_id):
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        job.cancel()
+        job._discarded = True
+        if job.is_finished:
+            job.remove_files()
+
+    # Function to drop finished jobs older than JOB_RETENTION
+    def prune(self):
+        cutoff = time.time() - JOB_RETENTION
+        with self._lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.is_finished and job.finished < cutoff]
+        for job_id in expired:
+            self.discard(job_id)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return {status: sum(job.status == status for job in jobs) for status in ("queued", "running") + FINISHED_STATES}
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
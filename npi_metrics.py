@@ -0,0 +1,140 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ENDPOINT_COUNTERS = ("requests", "errors", "retries", "bytes", "cache_hits", "cache_misses")
+
+
+# Function to map a request URL to a short endpoint label
+def endpoint_name(url):
+    parsed = urlparse(url)
+    parts = [part for part in parsed.path.split("/") if part]
+    # NPPES registry: /api/ (on npiregistry.cms.hhs.gov or a local stub)
+    if parsed.netloc == "npiregistry.cms.hhs.gov" or parts == ["api"]:
+        return "nppes"
+    # clinicaltables: /api/<table>/v3/search
+    if len(parts) >= 2 and parts[0] == "api":
+        return parts[1]
+    return parsed.netloc or url
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Function to estimate a quantile from the bucket counts (upper bound of the bucket holding it)
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = seen
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class Metrics:
+    """Process-wide request and stage metrics, safe to update from worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.stages = {}
+            self.started = time.time()
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = {"counters": dict.fromkeys(ENDPOINT_COUNTERS, 0), "latency": Histogram()}
+        return self.endpoints[endpoint]
+
+    def count(self, endpoint, counter, amount=1):
+        with self._lock:
+            self._endpoint(endpoint)["counters"][counter] += amount
+
+    # Function to record one HTTP attempt: its latency and response size
+    def observe_request(self, endpoint, seconds, size=0):
+        with self._lock:
+            entry = self._endpoint(endpoint)
+            entry["counters"]["requests"] += 1
+            entry["counters"]["bytes"] += size
+            entry["latency"].observe(seconds)
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+    # Function to time a block of work as a named stage
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "uptime_seconds": time.time() - self.started,
+                "endpoints": {name: {**entry["counters"], "latency": entry["latency"].to_dict()}
+                              for name, entry in self.endpoints.items()},
+                "stages": {name: histogram.to_dict() for name, histogram in self.stages.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    # Function to render the metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for counter in ENDPOINT_COUNTERS:
+            lines.append(f"# TYPE npi_{counter}_total counter")
+            for name, entry in snapshot["endpoints"].items():
+                lines.append(f'npi_{counter}_total{{endpoint="{name}"}} {entry[counter]}')
+        for metric, label, series in (
+            ("npi_request_duration_seconds", "endpoint", {name: entry["latency"] for name, entry in snapshot["endpoints"].items()}),
+            ("npi_stage_duration_seconds", "stage", snapshot["stages"]),
+        ):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in series.items():
+                for bound, count in histogram["buckets"].items():
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+# Function to parse per-host limits from "host=rate[:burst],..." (burst defaults to the rate)
+def parse_host_limits(spec):
+    limits = {}
+    for entry in filter(None, (part.strip() for part in (spec or "").split(","))):
+        host, _, value = entry.partition("=")
+        rate, _, burst = value.partition(":")
+        try:
+            limits[host.strip()] = {"rate": float(rate), "burst": int(burst or float(rate))}
+        except ValueError:
+            raise ValueError(f"Invalid rate limit {entry!r}; expected host=rate[:burst]") from None
+    return limits
+
+
+# Per-host request rate (tokens per second) and burst size; hosts not listed use DEFAULT_HOST_LIMITS.
+# NPI_RATE_LIMITS overrides or adds hosts, e.g. "npiregistry.cms.hhs.gov=10:5,clinicaltables.nlm.nih.gov=40"
+HOST_LIMITS = {
+    "npiregistry.cms.hhs.gov": {"rate": 20.0, "burst": 20},
+    "clinicaltables.nlm.nih.gov": {"rate": 20.0, "burst": 20},
+    **parse_host_limits(os.environ.get("NPI_RATE_LIMITS")),
+}
+DEFAULT_HOST_LIMITS = {"rate": float(os.environ.get("NPI_RATE_LIMIT", 50.0)),
+                       "burst": int(os.environ.get("NPI_RATE_BURST", 50))}
+
+# AIMD bounds on concurrent in-flight requests per host
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+DECREASE_FACTOR = 0.5
+# Congestion: the recent latency (fast EWMA) exceeds this multiple of the baseline (slow, decaying EWMA)
+LATENCY_TOLERANCE = 3.0
+RECENT_WEIGHT = 0.25
+BASELINE_WEIGHT = 0.02
+# Responses seen before the latency signal is trusted
+MIN_LATENCY_SAMPLES = 20
+THROTTLE_STATUSES = {429, 503}
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows by one per window of successes and halves on throttling or congestion.
+
+    Waiters are admitted in arrival order."""
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.recent_latency = None
+        self.baseline_latency = None
+        self.samples = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            ticket = object()
+            self._waiters.append(ticket)
+            while self._waiters[0] is not ticket or self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self._waiters.popleft()
+            self.in_flight += 1
+            # The next waiter may also fit under the limit
+            self._condition.notify_all()
+
+    def _observe_latency(self, latency):
+        if self.samples == 0:
+            self.recent_latency = self.baseline_latency = latency
+        else:
+            self.recent_latency += RECENT_WEIGHT * (latency - self.recent_latency)
+            self.baseline_latency += BASELINE_WEIGHT * (latency - self.baseline_latency)
+        self.samples += 1
+
+    def release(self, latency=None, status=None):
+        with self._condition:
+            self.in_flight -= 1
+            throttled = status in THROTTLE_STATUSES
+            if throttled:
+                self.throttled += 1
+            congested = throttled
+            if latency is not None and status is not None and not throttled:
+                self._observe_latency(latency)
+                congested = (self.samples >= MIN_LATENCY_SAMPLES
+                             and self.recent_latency > self.baseline_latency * LATENCY_TOLERANCE)
+            if congested:
+                # At most one decrease per current round trip, so one slow burst doesn't collapse the limit
+                now = time.monotonic()
+                if now - self._last_decrease > (self.recent_latency or 1.0):
+                    self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+            elif status is not None:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class HostLimiter:
+    """Token bucket plus AIMD concurrency control for one host."""
+
+    def __init__(self, rate, burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AIMDLimiter()
+
+    # Function to hold a request slot; the caller reports the outcome through the yielded callback
+    @contextmanager
+    def slot(self):
+        self.concurrency.acquire()
+        self.bucket.acquire()
+        outcome = {}
+        started = time.perf_counter()
+
+        def report(status):
+            outcome["status"] = status
+            outcome["latency"] = time.perf_counter() - started
+        try:
+            yield report
+        finally:
+            self.concurrency.release(outcome.get("latency"), outcome.get("status"))
+
+    def stats(self):
+        return {"limit": round(self.concurrency.limit, 2), "in_flight": self.concurrency.in_flight,
+                "rate": self.bucket.rate, "throttled": self.concurrency.throttled,
+                "recent_latency": self.concurrency.recent_latency,
+                "baseline_latency": self.concurrency.baseline_latency}
+
+
+# One limiter per host for the whole process, so every Streamlit session shares it
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# Function to get the shared limiter for a URL's host
+def get_limiter(url):
+    host = urlparse(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            limits = HOST_LIMITS.get(host, DEFAULT_HOST_LIMITS)
+            _limiters[host] = HostLimiter(limits["rate"], limits["burst"])
+        return _limiters[host]
+
+
+# Function to set a host's rate and burst; its limiter is rebuilt on the next request
+def set_host_limits(host, rate, burst=None):
+    with _limiters_lock:
+        HOST_LIMITS[host] = {"rate": float(rate), "burst": int(burst if burst is not None else rate)}
+        _limiters.pop(host, None)
+
+
+def stats():
+    with _limiters_lock:
+        return {host: limiter.stats() for host, limiter in _limiters.items()}
@@ -0,0 +1,140 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Weight of each signal in the candidate score; signals the uploaded row cannot provide are left out
+DEFAULT_WEIGHTS = {
+    "phone": 3.0,
+    "first_name": 2.0,
+    "middle_name": 0.5,
+    "last_name": 2.0,
+    "city": 1.0,
+    "state": 1.0,
+    "taxonomy": 1.0,
+}
+
+# A candidate is accepted when its score reaches MIN_SCORE and beats the runner-up by MIN_MARGIN
+MIN_SCORE = 0.6
+MIN_MARGIN = 0.1
+
+# Uploaded column feeding each signal
+ROW_COLUMNS = {
+    "phone": "Phone",
+    "first_name": "First Name",
+    "middle_name": "Middle Name",
+    "last_name": "Last Name",
+    "city": "City",
+    "state": "State",
+    "taxonomy": "Taxonomy",
+}
+
+
+# Function to reduce a phone number to its 10 national digits
+def phone_digits(phone):
+    digits = re.sub(r"\D", "", str(phone or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits
+
+
+# Function to normalize free text for comparison
+def normalize(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return " ".join(str(value).upper().replace(".", " ").replace(",", " ").split())
+
+
+# Function to score name agreement: exact 1.0, prefix/nickname-like 0.8, same initial 0.4
+def name_similarity(row_names, cand_names):
+    row_names = np.asarray(row_names, dtype=object)
+    cand_names = np.asarray(cand_names, dtype=object)
+    exact = row_names == cand_names
+    prefix = np.fromiter(
+        (bool(a) and bool(b) and (a.startswith(b) or b.startswith(a)) for a, b in zip(row_names, cand_names)),
+        dtype=bool, count=len(row_names),
+    )
+    initial = np.fromiter((bool(a) and bool(b) and a[0] == b[0] for a, b in zip(row_names, cand_names)),
+                          dtype=bool, count=len(row_names))
+    return np.where(exact, 1.0, np.where(prefix, 0.8, np.where(initial, 0.4, 0.0)))
+
+
+# Function to flatten (row, candidate Provider) pairs into one frame of normalized features
+def candidate_frame(rows, candidate_lists):
+    records = []
+    for row_id, (row, candidates) in enumerate(zip(rows, candidate_lists)):
+        for cand_id, result in enumerate(candidates):
+            taxonomies = result.taxonomies
+            location = result.addresses[0] if result.addresses else None
+            records.append({
+                "row": row_id,
+                "candidate": cand_id,
+                "cand_phones": tuple(phone_digits(address.telephone_number) for address in result.addresses),
+                "cand_first_name": normalize(result.first_name),
+                "cand_middle_name": normalize(result.middle_name),
+                "cand_last_name": normalize(result.last_name),
+                "cand_city": normalize(location.city if location else None),
+                "cand_state": normalize(location.state if location else None),
+                "cand_taxonomy": tuple(normalize(t.code) for t in taxonomies)
+                                 + tuple(normalize(t.desc) for t in taxonomies),
+            })
+    frame = pd.DataFrame.from_records(records, columns=[
+        "row", "candidate", "cand_phones", "cand_first_name", "cand_middle_name", "cand_last_name",
+        "cand_city", "cand_state", "cand_taxonomy",
+    ])
+    for signal, column in ROW_COLUMNS.items():
+        values = [row.get(column) if column in row else None for row in rows]
+        if signal == "phone":
+            values = [phone_digits(value) if normalize(value) else "" for value in values]
+        else:
+            values = [normalize(value) for value in values]
+        frame[f"row_{signal}"] = np.asarray(values, dtype=object)[frame["row"].to_numpy()] if len(frame) else []
+    return frame
+
+
+# Function to score every candidate of every row in one pass; returns the frame with a "score" column
+def score_candidates(rows, candidate_lists, weights=DEFAULT_WEIGHTS):
+    frame = candidate_frame(rows, candidate_lists)
+    if frame.empty:
+        frame["score"] = []
+        return frame
+
+    signals = {}
+    row_phone = frame["row_phone"].to_numpy()
+    exact_phone = np.fromiter((bool(p) and p in phones for p, phones in zip(row_phone, frame["cand_phones"])),
+                              dtype=bool, count=len(frame))
+    area_phone = np.fromiter((len(p) >= 3 and any(c[:3] == p[:3] for c in phones) for p, phones in zip(row_phone, frame["cand_phones"])),
+                             dtype=bool, count=len(frame))
+    signals["phone"] = np.where(exact_phone, 1.0, np.where(area_phone, 0.3, 0.0))
+    for name in ("first_name", "middle_name", "last_name"):
+        signals[name] = name_similarity(frame[f"row_{name}"], frame[f"cand_{name}"])
+    for place in ("city", "state"):
+        signals[place] = (frame[f"row_{place}"].to_numpy() == frame[f"cand_{place}"].to_numpy()).astype(float)
+    signals["taxonomy"] = np.fromiter((bool(t) and t in taxonomies for t, taxonomies in zip(frame["row_taxonomy"], frame["cand_taxonomy"])),
+                                      dtype=float, count=len(frame))
+
+    # Each signal only counts where the uploaded row has a value for it
+    total = np.zeros(len(frame))
+    available = np.zeros(len(frame))
+    for signal, weight in weights.items():
+        present = (frame[f"row_{signal}"].to_numpy() != "").astype(float) * weight
+        total += signals[signal] * present
+        available += present
+    frame["score"] = np.divide(total, available, out=np.zeros(len(frame)), where=available > 0)
+    return frame
+
+
+# Function to pick each row's best candidate: returns {row: (candidate, score, margin)} for accepted rows
+def pick_best(scored, min_score=MIN_SCORE, min_margin=MIN_MARGIN):
+    if scored.empty:
+        return {}
+    ranked = scored.sort_values(["row", "score", "candidate"], ascending=[True, False, True])
+    ranked["rank"] = ranked.groupby("row").cumcount()
+    best = ranked[ranked["rank"] == 0].set_index("row")
+    runner_up = ranked[ranked["rank"] == 1].set_index("row")["score"]
+    margin = best["score"] - runner_up.reindex(best.index).fillna(0.0)
+    accepted = (best["score"] >= min_score) & (margin >= min_margin)
+    return {
+        row: (int(best.at[row, "candidate"]), float(best.at[row, "score"]), float(margin.at[row]))
+        for row in best.index[accepted.to_numpy()]
+    }
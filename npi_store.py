@@ -0,0 +1,175 @@
+import sys
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Extract columns with few distinct values, stored dictionary-encoded
+CATEGORICAL_COLUMNS = (
+    "Provider Type", "Taxonomy Code", "Taxonomy Grouping", "Taxonomy Classification",
+    "Taxonomy Specialization", "City", "State", "Country", "Credential", "Entity Type",
+    "Matched Taxonomy Codes",
+)
+
+# Numeric identifier columns stored as fixed-width integers
+INTEGER_COLUMNS = ("NPI",)
+
+# Code / value used for a missing entry
+MISSING = -1
+
+
+class CategoricalColumn:
+    """Dictionary-encoded column: C int (32-bit) codes into a list of distinct values."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.categories = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def extend(self, values):
+        index, categories = self._index, self.categories
+        codes = []
+        for value in values:
+            if value is None:
+                codes.append(MISSING)
+                continue
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(categories)
+                categories.append(value)
+            codes.append(code)
+        self.codes.extend(codes)
+
+    def nbytes(self):
+        return (self.codes.itemsize * len(self.codes) + sys.getsizeof(self._index) + sys.getsizeof(self.categories)
+                + sum(sys.getsizeof(value) for value in self.categories))
+
+    # Function to build a pandas Categorical with sorted categories, so sorting the column is alphabetical
+    def to_pandas(self):
+        codes = np.frombuffer(self.codes, dtype=np.intc)
+        order = sorted(range(len(self.categories)), key=lambda code: str(self.categories[code]))
+        # rank[code] is the code's position among the sorted categories; the extra slot keeps MISSING at -1
+        rank = np.empty(len(order) + 1, dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        rank[MISSING] = MISSING
+        return pd.Categorical.from_codes(rank[codes], [self.categories[code] for code in order])
+
+    def to_arrow(self, pa):
+        codes = np.frombuffer(self.codes, dtype=np.intc)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes == MISSING),
+                                              pa.array(self.categories, type=pa.string()))
+
+
+class IntegerColumn:
+    """int64 column for digit-string identifiers such as the NPI."""
+
+    def __init__(self):
+        self.values = array("q")
+
+    def __len__(self):
+        return len(self.values)
+
+    def extend(self, values):
+        self.values.extend(
+            int(value) if isinstance(value, int) or (isinstance(value, str) and value.isdigit()) else MISSING
+            for value in values
+        )
+
+    def nbytes(self):
+        return self.values.itemsize * len(self.values)
+
+    # Function to wrap the buffer in a nullable Int64 array without copying the values
+    def to_pandas(self):
+        values = np.frombuffer(self.values, dtype=np.longlong)
+        return pd.arrays.IntegerArray(values, values == MISSING)
+
+    def to_arrow(self, pa):
+        values = np.frombuffer(self.values, dtype=np.longlong)
+        return pa.array(values, mask=values == MISSING)
+
+
+class StringColumn:
+    """Plain list of values, for free-text columns such as names and addresses."""
+
+    def __init__(self):
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def extend(self, values):
+        self.values.extend(values)
+
+    def nbytes(self):
+        return sys.getsizeof(self.values) + sum(sys.getsizeof(value) for value in self.values)
+
+    def to_pandas(self):
+        return pd.array(self.values, dtype=object)
+
+    def to_arrow(self, pa):
+        return pa.array(self.values, type=pa.string())
+
+
+class ResultStore:
+    """Array-backed, column-oriented store for Extract results, filled page by page.
+
+    Low-cardinality columns are dictionary-encoded and the NPI is an int64, so a row
+    costs a few bytes for most fields instead of a dict entry and a string each.
+    to_frame shares the integer buffers with the DataFrame instead of copying them, which
+    pins them (appending then raises BufferError): append every page before converting.
+    Categorical codes are remapped to sorted categories, so those columns are new arrays."""
+
+    def __init__(self, columns, categorical=CATEGORICAL_COLUMNS, integer=INTEGER_COLUMNS):
+        self.columns = list(columns)
+        self._data = {
+            column: CategoricalColumn() if column in categorical else IntegerColumn() if column in integer else StringColumn()
+            for column in self.columns
+        }
+
+    def __len__(self):
+        return len(self._data[self.columns[0]]) if self.columns else 0
+
+    # Function to append one page given as {column: list of values}, e.g. from parse_columns
+    def append_columns(self, columns):
+        lengths = {len(columns[column]) for column in self.columns}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        for column in self.columns:
+            self._data[column].extend(columns[column])
+
+    # Function to append one page of record dicts (missing keys become missing values)
+    def append_records(self, records):
+        self.append_columns({column: [record.get(column) for record in records] for column in self.columns})
+
+    def nbytes(self):
+        return sum(data.nbytes() for data in self._data.values())
+
+    def bytes_per_record(self):
+        return self.nbytes() / len(self) if len(self) else 0.0
+
+    def to_frame(self):
+        # copy=False, or pandas copies every column out of the dict
+        return pd.DataFrame({column: self._data[column].to_pandas() for column in self.columns}, columns=self.columns,
+                            copy=False)
+
+    def to_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Arrow conversion requires pyarrow (pip install pyarrow)") from e
+        return pa.table({column: self._data[column].to_arrow(pa) for column in self.columns})
+
+
+# Function to estimate the memory held by a list of record dicts, for comparison with ResultStore.nbytes
+def records_nbytes(records):
+    seen = {}
+    total = sys.getsizeof(records)
+    for record in records:
+        total += sys.getsizeof(record)
+        for key, value in record.items():
+            seen[id(key)] = key
+            seen[id(value)] = value
+    return total + sum(sys.getsizeof(value) for value in seen.values())
@@ -0,0 +1,329 @@
+"""Offline NPPES index: ingest the CMS dissemination file into SQLite and answer
+registry-style lookups locally, in the same shape as the NPPES API response.
+
+    python -m nppes_index ingest npidata_pfile.csv --db nppes.sqlite \
+        [--taxonomy-file nucc_taxonomy.csv] [--endpoints-file endpoint_pfile.csv]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+
+INDEX_PATH = os.environ.get("NPPES_INDEX_PATH", "nppes.sqlite")
+
+# Number of taxonomy slots in the dissemination file
+TAXONOMY_SLOTS = 15
+
+# Rows inserted per executemany batch during ingestion
+BATCH_SIZE = 10000
+
+PROVIDER_COLUMNS = [
+    "npi", "entity_type", "first_name", "last_name", "middle_name", "organization_name", "credential",
+    "loc_address_1", "loc_address_2", "loc_city", "loc_state", "loc_postal_code", "loc_country", "loc_phone",
+    "mail_address_1", "mail_address_2", "mail_city", "mail_state", "mail_postal_code", "mail_country", "mail_phone",
+]
+
+# Dissemination file header for each provider column (after npi)
+SOURCE_COLUMNS = {
+    "entity_type": "Entity Type Code",
+    "first_name": "Provider First Name",
+    "last_name": "Provider Last Name (Legal Name)",
+    "middle_name": "Provider Middle Name",
+    "organization_name": "Provider Organization Name (Legal Business Name)",
+    "credential": "Provider Credential Text",
+    "loc_address_1": "Provider First Line Business Practice Location Address",
+    "loc_address_2": "Provider Second Line Business Practice Location Address",
+    "loc_city": "Provider Business Practice Location Address City Name",
+    "loc_state": "Provider Business Practice Location Address State Name",
+    "loc_postal_code": "Provider Business Practice Location Address Postal Code",
+    "loc_country": "Provider Business Practice Location Address Country Code (If outside U.S.)",
+    "loc_phone": "Provider Business Practice Location Address Telephone Number",
+    "mail_address_1": "Provider First Line Business Mailing Address",
+    "mail_address_2": "Provider Second Line Business Mailing Address",
+    "mail_city": "Provider Business Mailing Address City Name",
+    "mail_state": "Provider Business Mailing Address State Name",
+    "mail_postal_code": "Provider Business Mailing Address Postal Code",
+    "mail_country": "Provider Business Mailing Address Country Code (If outside U.S.)",
+    "mail_phone": "Provider Business Mailing Address Telephone Number",
+}
+
+SCHEMA = """
+CREATE TABLE providers (
+    npi INTEGER PRIMARY KEY, entity_type TEXT,
+    first_name TEXT COLLATE NOCASE, last_name TEXT COLLATE NOCASE, middle_name TEXT,
+    organization_name TEXT COLLATE NOCASE, credential TEXT,
+    loc_address_1 TEXT, loc_address_2 TEXT, loc_city TEXT COLLATE NOCASE, loc_state TEXT COLLATE NOCASE,
+    loc_postal_code TEXT COLLATE NOCASE,
+    loc_country TEXT, loc_phone TEXT,
+    mail_address_1 TEXT, mail_address_2 TEXT, mail_city TEXT, mail_state TEXT, mail_postal_code TEXT,
+    mail_country TEXT, mail_phone TEXT
+);
+CREATE TABLE taxonomies (npi INTEGER, seq INTEGER, code TEXT, license TEXT, state TEXT, is_primary INTEGER);
+CREATE TABLE taxonomy_codes (code TEXT PRIMARY KEY, description TEXT);
+CREATE TABLE endpoints (npi INTEGER, endpoint TEXT);
+"""
+
+# Indexes are built after the bulk load, which is much faster than maintaining them per insert
+INDEXES = """
+CREATE INDEX providers_name ON providers (last_name, first_name);
+CREATE INDEX providers_org ON providers (organization_name);
+CREATE INDEX providers_state_city ON providers (loc_state, loc_city);
+CREATE INDEX providers_city ON providers (loc_city);
+CREATE INDEX providers_postal ON providers (loc_postal_code);
+CREATE INDEX providers_phone ON providers (loc_phone);
+CREATE INDEX taxonomies_npi ON taxonomies (npi);
+CREATE INDEX taxonomies_code ON taxonomies (code);
+CREATE INDEX endpoints_npi ON endpoints (npi);
+"""
+
+COUNTRY_NAMES = {"US": "United States"}
+
+
+# Function to open a CSV that may sit inside the zip CMS publishes
+def open_csv(path, member_prefix="npidata_pfile"):
+    if path.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        names = [name for name in archive.namelist()
+                 if name.lower().endswith(".csv") and name.lower().startswith(member_prefix) and "fileheader" not in name.lower()]
+        if not names:
+            raise ValueError(f"No {member_prefix}*.csv found in {path}")
+        return io.TextIOWrapper(archive.open(names[0]), encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+# Function to format a 10-digit phone the way the registry API returns it (555-555-5555)
+def format_phone(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 10:
+        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+    return phone or ""
+
+
+# Function to stream the dissemination file into a fresh SQLite index
+def ingest(csv_path, db_path=INDEX_PATH, taxonomy_file=None, endpoints_file=None, progress=None):
+    tmp_path = db_path + ".building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    provider_sql = f"INSERT OR REPLACE INTO providers ({', '.join(PROVIDER_COLUMNS)}) VALUES ({', '.join('?' * len(PROVIDER_COLUMNS))})"
+    taxonomy_sql = "INSERT INTO taxonomies (npi, seq, code, license, state, is_primary) VALUES (?, ?, ?, ?, ?, ?)"
+    count = 0
+    with open_csv(csv_path) as handle:
+        reader = csv.reader(handle)
+        header = next(reader)
+        position = {name: i for i, name in enumerate(header)}
+        npi_at = position["NPI"]
+        entity_type_at = position["Entity Type Code"]
+        provider_at = [position[SOURCE_COLUMNS[column]] for column in PROVIDER_COLUMNS[1:]]
+        taxonomy_at = [
+            (position[f"Healthcare Provider Taxonomy Code_{slot}"],
+             position[f"Provider License Number_{slot}"],
+             position[f"Provider License Number State Code_{slot}"],
+             position[f"Healthcare Provider Primary Taxonomy Switch_{slot}"])
+            for slot in range(1, TAXONOMY_SLOTS + 1)
+        ]
+        phone_columns = {PROVIDER_COLUMNS.index("loc_phone") - 1, PROVIDER_COLUMNS.index("mail_phone") - 1}
+
+        providers, taxonomies = [], []
+        for row in reader:
+            # Deactivated NPIs have no entity type and no provider data
+            if not row[entity_type_at]:
+                continue
+            npi = int(row[npi_at])
+            values = [row[i] for i in provider_at]
+            for i in phone_columns:
+                values[i] = format_phone(values[i])
+            providers.append([npi] + values)
+            for seq, (code_at, license_at, state_at, switch_at) in enumerate(taxonomy_at):
+                if row[code_at]:
+                    taxonomies.append((npi, seq, row[code_at], row[license_at], row[state_at], row[switch_at] == "Y"))
+            count += 1
+            if len(providers) >= BATCH_SIZE:
+                conn.executemany(provider_sql, providers)
+                conn.executemany(taxonomy_sql, taxonomies)
+                providers, taxonomies = [], []
+                if progress:
+                    progress(count)
+        conn.executemany(provider_sql, providers)
+        conn.executemany(taxonomy_sql, taxonomies)
+
+    # Optional NUCC taxonomy code set, used for the "desc" field
+    if taxonomy_file:
+        with open(taxonomy_file, encoding="utf-8-sig", newline="") as handle:
+            conn.executemany(
+                "INSERT OR REPLACE INTO taxonomy_codes (code, description) VALUES (?, ?)",
+                ((row["Code"], row.get("Display Name") or row.get("Classification", "")) for row in csv.DictReader(handle)),
+            )
+
+    # Optional endpoint file, used for the "API Email" column
+    if endpoints_file:
+        with open_csv(endpoints_file, member_prefix="endpoint_pfile") as handle:
+            conn.executemany(
+                "INSERT INTO endpoints (npi, endpoint) VALUES (?, ?)",
+                ((int(row["NPI"]), row["Endpoint"]) for row in csv.DictReader(handle) if row.get("NPI")),
+            )
+
+    conn.executescript(INDEXES)
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return count
+
+
+class NppesIndex:
+    """Read-only lookups against an ingested index, one SQLite connection per thread."""
+
+    def __init__(self, db_path=INDEX_PATH):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"NPPES index not found: {db_path}")
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # Function to answer a registry API query (number, first_name, last_name, ...) from the index
+    def search(self, params):
+        clauses, args = [], []
+
+        def match(column, value):
+            value = str(value).strip()
+            # Registry semantics: exact, case-insensitive, or a trailing * wildcard after 2 characters
+            if value.endswith("*"):
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                args.append(value[:-1].replace("%", r"\%").replace("_", r"\_") + "%")
+            else:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+
+        number = str(params.get("number") or "").strip()
+        if number:
+            if not number.isdigit():
+                return {"result_count": 0, "results": []}
+            clauses.append("p.npi = ?")
+            args.append(int(number))
+        for param, column in (("first_name", "p.first_name"), ("last_name", "p.last_name"),
+                              ("organization_name", "p.organization_name"), ("city", "p.loc_city"),
+                              ("state", "p.loc_state")):
+            if str(params.get(param) or "").strip():
+                match(column, params[param])
+        postal_code = str(params.get("postal_code") or "").strip()
+        if postal_code:
+            # A 5-digit postal code also returns the 9-digit zip + 4; the NOCASE column lets LIKE use providers_postal
+            clauses.append("p.loc_postal_code LIKE ? ESCAPE '\\'")
+            args.append(postal_code.rstrip("*").replace("%", r"\%").replace("_", r"\_") + "%")
+        taxonomy_description = str(params.get("taxonomy_description") or "").strip()
+        if taxonomy_description:
+            pattern = taxonomy_description[:-1] + "%" if taxonomy_description.endswith("*") else taxonomy_description
+            clauses.append(
+                "p.npi IN (SELECT t.npi FROM taxonomies t LEFT JOIN taxonomy_codes c ON c.code = t.code"
+                " WHERE c.description LIKE ? OR t.code LIKE ?)"
+            )
+            args.extend([pattern, pattern])
+        if not clauses:
+            return {"result_count": 0, "results": []}
+
+        limit = int(params.get("limit") or 10)
+        skip = int(params.get("skip") or 0)
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT p.* FROM providers p WHERE {' AND '.join(clauses)} ORDER BY p.npi LIMIT ? OFFSET ?",
+            args + [limit, skip],
+        ).fetchall()
+        results = [self._result(conn, row) for row in rows]
+        return {"result_count": len(results), "results": results}
+
+    # Function to shape one provider row like a registry API result
+    def _result(self, conn, row):
+        npi = row["npi"]
+        taxonomies = [
+            {"code": t["code"], "desc": t["description"] or t["code"], "primary": bool(t["is_primary"]),
+             "license": t["license"], "state": t["state"]}
+            for t in conn.execute(
+                "SELECT t.code, t.license, t.state, t.is_primary, c.description FROM taxonomies t"
+                " LEFT JOIN taxonomy_codes c ON c.code = t.code WHERE t.npi = ? ORDER BY t.seq", (npi,))
+        ]
+        addresses = [self._address(row, "loc", "LOCATION"), self._address(row, "mail", "MAILING")]
+        endpoints = [{"endpoint": e[0]} for e in conn.execute("SELECT endpoint FROM endpoints WHERE npi = ?", (npi,))]
+        basic = {"first_name": row["first_name"], "last_name": row["last_name"], "middle_name": row["middle_name"],
+                 "credential": row["credential"]}
+        if row["organization_name"]:
+            basic["organization_name"] = row["organization_name"]
+        return {
+            "number": str(npi),
+            "enumeration_type": "NPI-1" if row["entity_type"] == "1" else "NPI-2",
+            "basic": basic,
+            "taxonomies": taxonomies,
+            "addresses": addresses,
+            "endpoints": endpoints,
+        }
+
+    @staticmethod
+    def _address(row, prefix, purpose):
+        country = row[f"{prefix}_country"] or "US"
+        return {
+            "address_purpose": purpose,
+            "address_1": row[f"{prefix}_address_1"],
+            "address_2": row[f"{prefix}_address_2"],
+            "city": row[f"{prefix}_city"],
+            "state": row[f"{prefix}_state"],
+            "postal_code": row[f"{prefix}_postal_code"],
+            "country_code": country,
+            "country_name": COUNTRY_NAMES.get(country, country),
+            "telephone_number": row[f"{prefix}_phone"],
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# Function to get a shared index for a path
+def get_index(db_path=INDEX_PATH):
+    with _indexes_lock:
+        if db_path not in _indexes:
+            _indexes[db_path] = NppesIndex(db_path)
+        return _indexes[db_path]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline NPPES index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = commands.add_parser("ingest", help="load an NPPES dissemination CSV (or zip)")
+    ingest_cmd.add_argument("csv_path")
+    ingest_cmd.add_argument("--db", default=INDEX_PATH)
+    ingest_cmd.add_argument("--taxonomy-file", help="NUCC taxonomy CSV for taxonomy descriptions")
+    ingest_cmd.add_argument("--endpoints-file", help="NPPES endpoint_pfile CSV for API emails")
+    lookup_cmd = commands.add_parser("lookup", help="run a registry-style query against the index")
+    lookup_cmd.add_argument("--db", default=INDEX_PATH)
+    lookup_cmd.add_argument("params", nargs="+", help="key=value registry parameters, e.g. last_name=SMITH state=CA")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        started = time.perf_counter()
+        count = ingest(args.csv_path, args.db, args.taxonomy_file, args.endpoints_file,
+                       progress=lambda n: print(f"\r{n} providers", end="", file=sys.stderr))
+        print(f"\nIndexed {count} providers into {args.db} in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+    else:
+        params = dict(param.split("=", 1) for param in args.params)
+        print(json.dumps(NppesIndex(args.db).search(params), indent=2))
+
+
+if __name__ == "__main__":
+    main()
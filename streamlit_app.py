@@ -4,266 +4,865 @@ import pandas as pd
 from PIL import Image
 from io import BytesIO
 import openpyxl
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import sqlite3
+import npi_cache
+import npi_client
+import npi_decode
+import npi_export
+import npi_input
+import npi_jobs
+import nppes_index
+import npi_ratelimit
+import npi_scoring
+import npi_store
+from npi_metrics import metrics
 
 
+# Lookup backends: the live NPPES registry API, or the offline index built by nppes_index
+BACKENDS = ("api", "local")
+
+# The background job (npi_jobs.Job) the current thread works for, if any, and the response
+# cache mode of the session that started the work (see cache_mode())
+_job_context = threading.local()
+
+# Function to get the current session's response cache mode (None uses the cache's default)
+def cache_mode():
+    return getattr(_job_context, "cache_mode", None)
+
+logger = logging.getLogger(__name__)
+
+# Function to show a warning on the page, record it on the job when running in the background,
+# or log it (stderr) when there is no Streamlit session, e.g. in npi_cli
+def warn(message):
+    job = getattr(_job_context, "job", None)
+    if job is not None:
+        job.warn(message)
+    elif get_script_run_ctx(suppress_warning=True) is not None:
+        st.warning(message)
+    else:
+        logger.warning(message)
+
+# Function to answer a registry query from the offline NPPES index
+def call_local_index(params):
+    started = time.perf_counter()
+    try:
+        data = npi_decode.decode_registry(nppes_index.get_index().search(params))
+        metrics.observe_request("local_index", time.perf_counter() - started)
+        return data
+    except (OSError, sqlite3.Error, ValueError) as e:
+        metrics.count("local_index", "errors")
+        warn(f"Local NPPES index lookup failed: {e}")
+        return {}
+
 # Function to call the API
-def call_npi_api(params):
-    base_url = "https://npiregistry.cms.hhs.gov/api/"
+def call_npi_api(params, backend="api"):
+    if backend == "local":
+        return call_local_index(params)
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raises an error for bad status codes
-        return response.json()
+        # Shared pooled session with timeouts, retries on 429/5xx and the on-disk response cache;
+        # results are decoded into compact npi_decode.Provider records
+        return npi_client.get_json(npi_client.NPPES_URL, params=params, decode=npi_decode.registry_from_json,
+                                   cache_mode=cache_mode())
     except requests.exceptions.RequestException as e:
         # If there's any issue with the request, log the error and return an empty dict
-        st.warning(f"API request failed: {e}")
+        warn(f"API request failed: {e}")
         return {}  # Return empty dictionary if request fails
     except ValueError as e:
         # If the JSON is invalid or any other issue occurs
-        st.warning(f"Failed to parse JSON: {e}")
+        metrics.count("nppes", "errors")
+        warn(f"Failed to parse JSON: {e}")
         return {}  # Return empty dictionary if JSON parsing fails
 
-def fetch_npi_data(taxonomy_code, entity_type, count=100):
-    offset = 0
-    all_data = []
-    
-    # Decide the base API URL based on entity_type
+# clinicaltables page size limits for Extract NPI Data
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Number of extracted records shown on the page while an extract is still running
+EXTRACT_PREVIEW_ROWS = 1000
+
+# Default number of pages fetched in parallel per (taxonomy code, entity type)
+DEFAULT_PAGE_WORKERS = 4
+
+NPI_FIELDS = 'NPI,provider_type,name.full,addr_practice.full,licenses,name.credential,addr_practice.city,addr_practice.state,addr_practice.zip,addr_practice.phone,addr_practice.country'
+
+# Column order of the Extract NPI Data output
+EXTRACT_COLUMNS = [
+    'NPI', 'Name', 'Provider Type', 'Taxonomy Code',
+    'Taxonomy Grouping', 'Taxonomy Classification',
+    'Taxonomy Specialization', 'Address',
+    'City', 'State',
+    'ZIP Code', 'Phone', 'Country',
+    'Credential', 'Entity Type'
+]
+
+# Extra Extract column: which of the requested taxonomy codes each provider holds
+EXTRACT_MATCH_COLUMN = 'Matched Taxonomy Codes'
+EXTRACT_OUTPUT_COLUMNS = EXTRACT_COLUMNS + [EXTRACT_MATCH_COLUMN]
+
+# Taxonomy codes combined into one clinicaltables query with OR (1 queries each code separately)
+TAXONOMY_BATCH_SIZE = 10
+
+# Function to pick the clinicaltables endpoint for an entity type
+def npi_search_url(entity_type):
     if entity_type == 'individual':
-        api_url = 'https://clinicaltables.nlm.nih.gov/api/npi_idv/v3/search'
+        return npi_client.CLINICALTABLES_URL + 'npi_idv/v3/search'
     elif entity_type == 'organization':
-        api_url = 'https://clinicaltables.nlm.nih.gov/api/npi_org/v3/search'
-    else:
+        return npi_client.CLINICALTABLES_URL + 'npi_org/v3/search'
+    return None
+
+# Function to build the clinicaltables filter for one taxonomy code or a batch of codes
+def taxonomy_query(taxonomy_code):
+    if isinstance(taxonomy_code, str):
+        return f'licenses.taxonomy.code:{taxonomy_code}'
+    if len(taxonomy_code) == 1:
+        return f'licenses.taxonomy.code:{taxonomy_code[0]}'
+    return f'licenses.taxonomy.code:({" OR ".join(taxonomy_code)})'
+
+# Function to split taxonomy codes (duplicates removed, order kept) into batches queried together
+def plan_taxonomy_batches(taxonomy_codes, batch_size=TAXONOMY_BATCH_SIZE):
+    codes = list(dict.fromkeys(taxonomy_codes))
+    batch_size = max(1, int(batch_size))
+    return [tuple(codes[start:start + batch_size]) for start in range(0, len(codes), batch_size)]
+
+class PageFetchError(Exception):
+    """An Extract page that still failed after retries, raised instead of skipped when strict."""
+
+
+# Function to fetch one page, returning (total_records, npi_results) or None if it still fails after retries
+# (strict raises PageFetchError instead); taxonomy_code may be a single code or a tuple of codes matched with OR
+def fetch_npi_page(api_url, taxonomy_code, entity_type, offset, count, strict=False):
+    params = {
+        'terms': '',
+        'q': taxonomy_query(taxonomy_code),
+        'ef': NPI_FIELDS,
+        'count': count,
+        'offset': offset
+    }
+    try:
+        data = npi_client.get_json(api_url, params=params, cache_mode=cache_mode())
+        # Total number of records, and the third element containing the fields like NPI, provider_type, etc.
+        return data[0], data[2]
+    except (requests.exceptions.RequestException, ValueError, IndexError, TypeError) as e:
+        # Skip a page that still fails after retries instead of aborting the whole extract
+        codes = taxonomy_code if isinstance(taxonomy_code, str) else ", ".join(taxonomy_code)
+        message = f"Failed to fetch {entity_type} page at offset {offset} for {codes}: {e}"
+        if strict:
+            raise PageFetchError(message) from e
+        warn(message)
         return None
-    
-    while True:
-        params = {
-            'terms': '',
-            'q': f'licenses.taxonomy.code:{taxonomy_code}',
-            'ef': 'NPI,provider_type,name.full,addr_practice.full,licenses,name.credential,addr_practice.city,addr_practice.state,addr_practice.zip,addr_practice.phone,addr_practice.country',
-            'count': count,
-            'offset': offset
-        }
-        
-        response = requests.get(api_url, params=params)
-        data = response.json()
 
-        # Extract total number of records and results
-        total_records = data[0]
-        npi_results = data[2]  # Third element contains the fields like NPI, provider_type, etc.
+# Function to build a thread pool initializer that attaches the current Streamlit script context
+# (or background job, so warnings from worker threads still reach it) and cache mode
+def script_ctx_initializer():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    job = getattr(_job_context, "job", None)
+    mode = cache_mode()
+    def attach_ctx():
+        _job_context.job = job
+        _job_context.cache_mode = mode
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+    return attach_ctx
 
-        # Break loop if no more data is returned
-        if not npi_results.get("NPI"):
-            break
-        
-        all_data.extend(parse_data(npi_results,entity_type))
-        offset += count
+# Function to stream parsed column pages (see parse_page) for one (taxonomy code, entity type), in offset order;
+# start_offset resumes a partially extracted pair; requested_codes adds the Matched Taxonomy Codes column;
+# strict raises PageFetchError at a page that still fails, so a checkpointing caller never skips it
+def iter_npi_pages(taxonomy_code, entity_type, count=DEFAULT_PAGE_SIZE, max_workers=1, start_offset=0, requested_codes=None,
+                   strict=False):
+    api_url = npi_search_url(entity_type)
+    if api_url is None:
+        return
+    count = max(1, min(int(count), MAX_PAGE_SIZE))
 
-        # If we have fetched all results, exit the loop
-        if offset >= total_records:
-            break
-    
+    # The first page tells us total_records, so every remaining offset is known up front
+    first = fetch_npi_page(api_url, taxonomy_code, entity_type, start_offset, count, strict)
+    if first is None:
+        return
+    total_records, npi_results = first
+    if not npi_results.get("NPI"):
+        return
+    yield parse_page(npi_results, entity_type, requested_codes)
+
+    # Sliding window of in-flight pages: memory stays bounded by window * page size, not result size
+    max_workers = max(1, int(max_workers))
+    offsets = iter(range(start_offset + count, total_records, count))
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=script_ctx_initializer()) as executor:
+        pending = deque()
+        for offset in offsets:
+            pending.append(executor.submit(fetch_npi_page, api_url, taxonomy_code, entity_type, offset, count, strict))
+            if len(pending) >= max_workers * 2:
+                break
+        while pending:
+            page = pending.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(executor.submit(fetch_npi_page, api_url, taxonomy_code, entity_type, offset, count, strict))
+            # Failed or empty pages yield {} so consumers can count pages for checkpointing
+            if page is None or not page[1].get("NPI"):
+                yield {}
+                continue
+            yield parse_page(page[1], entity_type, requested_codes)
+
+def fetch_npi_data(taxonomy_code, entity_type, count=DEFAULT_PAGE_SIZE, max_workers=1):
+    if npi_search_url(entity_type) is None:
+        return None
+    all_data = []
+    for page in iter_npi_pages(taxonomy_code, entity_type, count, max_workers):
+        all_data.extend(page_records(page))
     return all_data
 
+# Function to put an item on a bounded queue unless the consumer has stopped
+def _put_unless_stopped(out, item, stop):
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+# Function to run one pair's page stream into a bounded queue (None marks the end)
+def _pump_pages(pages, out, stop):
+    # A pair still queued when the consumer stopped must not fetch its first page
+    if stop.is_set():
+        return
+    try:
+        for page in pages:
+            if not _put_unless_stopped(out, page, stop):
+                return
+    finally:
+        _put_unless_stopped(out, None, stop)
+
+# Function to stream several (taxonomy code, entity type) pairs in parallel, yielding
+# (taxonomy_code, entity_type, page) in input order
+def iter_npi_pages_many(pairs, count=DEFAULT_PAGE_SIZE, page_workers=DEFAULT_PAGE_WORKERS, pair_workers=2, buffered_pages=4,
+                        requested_codes=None):
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max(1, int(pair_workers)), initializer=script_ctx_initializer()) as executor:
+        try:
+            queues = []
+            producers = []
+            for taxonomy_code, entity_type in pairs:
+                out = queue.Queue(maxsize=buffered_pages)
+                producers.append(executor.submit(_pump_pages, iter_npi_pages(taxonomy_code, entity_type, count, page_workers, requested_codes=requested_codes), out, stop))
+                queues.append(out)
+            for (taxonomy_code, entity_type), out, producer in zip(pairs, queues, producers):
+                while True:
+                    page = out.get()
+                    if page is None:
+                        # Re-raise anything that ended the pair's stream early
+                        producer.result()
+                        break
+                    yield taxonomy_code, entity_type, page
+        finally:
+            # Unblock running producers and drop queued ones if the consumer stops early
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# Function to turn an NPI into its seen-set key: NPIs are 10-digit strings, and as ints the
+# seen-set stays small on multi-million row extracts
+def npi_key(npi):
+    return int(npi) if isinstance(npi, str) and npi.isdigit() else npi
+
+# Function to drop the rows of a column page whose NPI is already in `seen`, adding the NPIs of the rows kept;
+# returns {} when no row is left
+def drop_seen(page, seen):
+    keep = []
+    for row, npi in enumerate(page.get("NPI", ())):
+        key = npi_key(npi)
+        if key not in seen:
+            seen.add(key)
+            keep.append(row)
+    if not keep:
+        return {}
+    if len(keep) == len(page["NPI"]):
+        return page
+    return {column: [values[row] for row in keep] for column, values in page.items()}
+
+# Function to stream an extract for many taxonomy codes: codes are queried in OR batches and each
+# provider is kept once, yielding (batch, entity_type, page) with already-seen NPIs removed
+def iter_extract_pages(taxonomy_codes, entity_types, count=DEFAULT_PAGE_SIZE, page_workers=DEFAULT_PAGE_WORKERS,
+                       batch_size=TAXONOMY_BATCH_SIZE, pair_workers=2):
+    codes = list(dict.fromkeys(taxonomy_codes))
+    pairs = [(batch, entity) for batch in plan_taxonomy_batches(codes, batch_size) for entity in entity_types]
+    seen = set()
+    for batch, entity_type, page in iter_npi_pages_many(pairs, count, page_workers, pair_workers, requested_codes=codes):
+        yield batch, entity_type, drop_seen(page, seen)
+
+# Function to run an Extract as a background job; pages are persisted as they arrive
+def run_extract_job(job, taxonomy_list, entity_types, page_size, page_workers, batch_size, cache_mode=None):
+    _job_context.job = job
+    _job_context.cache_mode = cache_mode
+    try:
+        total = len(plan_taxonomy_batches(taxonomy_list, batch_size)) * len(entity_types)
+        job.progress(0, total)
+        counts = {(taxonomy_code, entity): 0 for taxonomy_code in taxonomy_list for entity in entity_types}
+        job.stats["counts"] = counts
+        current, done = None, 0
+        pages = iter_extract_pages(taxonomy_list, entity_types, count=page_size, page_workers=page_workers, batch_size=batch_size)
+        for batch, entity, page in pages:
+            if job.cancelled:
+                # Closing the stream stops running pairs and drops queued ones before the job ends
+                pages.close()
+                break
+            if (batch, entity) != current:
+                done += current is not None
+                current = (batch, entity)
+                job.progress(done)
+            if not page:
+                continue
+            job.add_columns(page, EXTRACT_OUTPUT_COLUMNS)
+            for matched in page[EXTRACT_MATCH_COLUMN]:
+                for taxonomy_code in matched.split("; "):
+                    if (taxonomy_code, entity) in counts:
+                        counts[(taxonomy_code, entity)] += 1
+        if not job.cancelled:
+            job.progress(total)
+    finally:
+        _job_context.job = None
+        _job_context.cache_mode = None
+
+# Function to pick the primary taxonomy in one pass: first "Y", else first "X", else the first license's
+def resolve_primary_taxonomy(licenses):
+    primary_x = None
+    for license_group in licenses:
+        taxonomy_info = license_group.get('taxonomy')
+        if not taxonomy_info:
+            continue
+        is_primary = license_group.get('is_primary_taxonomy')
+        if is_primary == "Y":
+            return taxonomy_info
+        if is_primary == "X" and primary_x is None:
+            primary_x = taxonomy_info
+    if primary_x is not None:
+        return primary_x
+    return licenses[0].get('taxonomy') if licenses else None
+
+# Function to parse a clinicaltables page column by column, returning {column: list of values}
+def parse_columns(npi_results, entity_type):
+    with metrics.timed("parse"):
+        return _parse_columns(npi_results, entity_type)
+
+def _parse_columns(npi_results, entity_type):
+    codes, groupings, classifications, specializations = [], [], [], []
+    for licenses in npi_results["licenses"]:
+        primary_taxonomy = resolve_primary_taxonomy(licenses)
+        if primary_taxonomy:
+            codes.append(primary_taxonomy.get("code", "None"))
+            groupings.append(primary_taxonomy.get("grouping", "None"))
+            classifications.append(primary_taxonomy.get("classification", "None"))
+            specializations.append(primary_taxonomy.get("specialization", "None"))
+        else:
+            codes.append("None")
+            groupings.append("None")
+            classifications.append("None")
+            specializations.append("None")
+
+    return {
+        "NPI": list(npi_results["NPI"]),
+        "Name": list(npi_results["name.full"]),
+        "Provider Type": list(npi_results["provider_type"]),
+        "Taxonomy Code": codes,
+        "Taxonomy Grouping": groupings,
+        "Taxonomy Classification": classifications,
+        "Taxonomy Specialization": specializations,
+        "Address": list(npi_results["addr_practice.full"]),
+        "City": list(npi_results["addr_practice.city"]),
+        "State": list(npi_results["addr_practice.state"]),
+        "ZIP Code": list(npi_results["addr_practice.zip"]),
+        "Phone": list(npi_results["addr_practice.phone"]),
+        "Country": list(npi_results["addr_practice.country"]),
+        "Credential": list(npi_results["name.credential"]),
+        "Entity Type": [entity_type] * len(npi_results["NPI"]),
+    }
+
 # Function to parse and clean the data, removing null fields and handling licenses
 def parse_data(npi_results,entity_type):
-    cleaned_data = []
-
-    for i in range(len(npi_results["NPI"])):
-        npi = npi_results["NPI"][i]
-        name = npi_results["name.full"][i]
-        provider_type = npi_results["provider_type"][i]
-        addr_practice = npi_results["addr_practice.full"][i]
-        city = npi_results["addr_practice.city"][i]
-        state = npi_results["addr_practice.state"][i]
-        zip_code = npi_results["addr_practice.zip"][i]
-        phone = npi_results["addr_practice.phone"][i]
-        country = npi_results["addr_practice.country"][i]
-        credential = npi_results["name.credential"][i]
-
-        # Initialize primary taxonomy as None
-        primary_taxonomy = None
-
-        # Get the licenses information
-        licenses = npi_results["licenses"][i]
-
-        # First, try to find the license with is_primary_taxonomy == "Y"
-        for license_group in licenses:
-            taxonomy_info = license_group.get('taxonomy')
-            is_primary = license_group.get('is_primary_taxonomy')
-            
-            if is_primary == "Y" and taxonomy_info:
-                primary_taxonomy = taxonomy_info
-                break
+    columns = parse_columns(npi_results, entity_type)
+    return [
+        {"NPI": npi, "Name": name, "Provider Type": provider_type, "Taxonomy Code": code,
+         "Taxonomy Grouping": grouping, "Taxonomy Classification": classification,
+         "Taxonomy Specialization": specialization, "Address": address, "City": city, "State": state,
+         "ZIP Code": zip_code, "Phone": phone, "Country": country, "Credential": credential,
+         "Entity Type": entity_type}
+        for npi, name, provider_type, code, grouping, classification, specialization, address, city, state, zip_code, phone, country, credential
+        in zip(*(columns[column] for column in EXTRACT_COLUMNS[:-1]))
+    ]
 
-        # If no "Y", check for is_primary_taxonomy == "X"
-        if not primary_taxonomy:
-            for license_group in licenses:
-                taxonomy_info = license_group.get('taxonomy')
-                is_primary = license_group.get('is_primary_taxonomy')
-                
-                if is_primary == "X" and taxonomy_info:
-                    primary_taxonomy = taxonomy_info
-                    break
-
-        # Fallback: If no "Y" or "X", use the first available taxonomy
-        if not primary_taxonomy and licenses:
-            primary_taxonomy = licenses[0].get('taxonomy')
-
-        # Append the cleaned data
-        cleaned_data.append({
-            "NPI": npi,
-            "Name": name,
-            "Provider Type": provider_type,
-            "Taxonomy Code": primary_taxonomy.get("code", "None") if primary_taxonomy else "None",
-            "Taxonomy Grouping": primary_taxonomy.get("grouping", "None") if primary_taxonomy else "None",
-            "Taxonomy Classification": primary_taxonomy.get("classification", "None") if primary_taxonomy else "None",
-            "Taxonomy Specialization": primary_taxonomy.get("specialization", "None") if primary_taxonomy else "None",
-            "Address": addr_practice,
-            "City": city,
-            "State": state,
-            "ZIP Code": zip_code,
-            "Phone": phone,
-            "Country": country,
-            "Credential": credential,
-            "Entity Type":entity_type
-        })
-    
-    return cleaned_data
+# Function to list, per provider, which requested codes its licenses hold (in request order, "; "-joined)
+def matched_taxonomy_codes(licenses_column, requested_codes):
+    order = {code: index for index, code in enumerate(requested_codes)}
+    matched = []
+    for licenses in licenses_column:
+        held = {(license_group.get('taxonomy') or {}).get('code') for license_group in licenses}
+        matched.append("; ".join(sorted((code for code in held if code in order), key=order.get)))
+    return matched
+
+# Function to parse a page into {column: list of values} (no per-row dicts), with the
+# Matched Taxonomy Codes column when requested_codes is given
+def parse_page(npi_results, entity_type, requested_codes=None):
+    columns = parse_columns(npi_results, entity_type)
+    if requested_codes:
+        columns[EXTRACT_MATCH_COLUMN] = matched_taxonomy_codes(npi_results["licenses"], requested_codes)
+    return columns
+
+# Function to turn a column page into a list of record dicts
+def page_records(page):
+    return [dict(zip(page, row)) for row in zip(*page.values())]
 
 # Function to download the DataFrame as an Excel file
 def download_dataframe_as_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False)
-        writer.close()  # Use close() instead of save()
-    processed_data = output.getvalue()
-    return processed_data
+    path = npi_export.export_dataframe(df, "xlsx")
+    try:
+        with open(path, "rb") as excel_file:
+            return excel_file.read()
+    finally:
+        os.remove(path)
 
 # Function to extract required data from the API response
 def extract_data(data):
     extracted_data = []
     for result in data.get("results", []):
-        # NPI Number
-        npi_number = result.get("number", "")
-        
         # Name
-        basic_info = result.get("basic", {})
-        first_name = basic_info.get("first_name", "")
-        last_name = basic_info.get("last_name", "")
-        middle_name = basic_info.get("middle_name", "")
-        name = f"{first_name} {middle_name} {last_name}".strip()
+        name = f"{result.first_name} {result.middle_name} {result.last_name}".strip()
 
         # Primary Taxonomy and License
-        taxonomies = result.get("taxonomies", [])
         primary_taxonomy = ""
         primary_license = ""
-        for taxonomy in taxonomies:
-            if taxonomy.get("primary", False):
-                primary_taxonomy = taxonomy.get("desc", "")
-                primary_license = taxonomy.get("license", "")
+        for taxonomy in result.taxonomies:
+            if taxonomy.primary:
+                primary_taxonomy = taxonomy.desc
+                primary_license = taxonomy.license
                 break
 
         # Primary Practice Address
-        addresses = result.get("addresses", [])
         primary_address = ""
         primary_city = ""
         primary_state = ""
-        if len(addresses) > 0:
+        if result.addresses:
+            address = result.addresses[0]
             primary_address = "\n".join(filter(None, [
-                addresses[0].get('address_1', ''),
-                addresses[0].get('address_2', ''),
-                f"{addresses[0].get('city', '')}, {addresses[0].get('state', '')} {addresses[0].get('postal_code', '')}",
-                addresses[0].get('country_name', ''),
-                f"Phone: {addresses[0].get('telephone_number', '')}"
+                address.address_1,
+                address.address_2,
+                f"{address.city}, {address.state} {address.postal_code}",
+                address.country_name,
+                f"Phone: {address.telephone_number}"
             ]))
-            primary_city = addresses[0].get('city', '')
-            primary_state = addresses[0].get('state', '')
-
-        # Email
-        endpoints = result.get("endpoints", [])
-        emails = "\n".join(endpoint.get("endpoint", "") for endpoint in endpoints)
+            primary_city = address.city
+            primary_state = address.state
 
         # Append the extracted data to the list
         extracted_data.append({
-            "NPI": npi_number,
+            "NPI": result.number,
             "Name": name,
             "Primary Taxonomy": primary_taxonomy,
             "Primary License": primary_license,  # Add the license here
             "Primary Practice Address": primary_address,
             "Primary City": primary_city,
             "Primary State": primary_state,
-            "API Email": emails
+            "API Email": "\n".join(result.endpoints)
         })
     return extracted_data   
 
-def process_file(file, match_npi, match_first_name, match_last_name, match_phone, match_area_code):
-    df = pd.read_excel(file, dtype={'Phone': str})
-    result_data = []
+# Empty output columns used when a row has no unique match
+EMPTY_MATCH = {"NPI": "", "Name": "", "Primary Taxonomy": "", "Primary License": "", "Primary Practice Address": "", "Primary City": "", "Primary State": "", "API Email": ""}
 
-    for index, row in df.iterrows():
-        params = {
-            "version": "2.1",
-            "limit": 200  # Added the limit parameter here
-        }
+# Default number of rows looked up in parallel by process_file
+DEFAULT_MATCH_WORKERS = 8
 
-        if match_npi and 'NPI' in row:
-            params["number"] = row.get('NPI', '')
+# Function to build the registry query parameters for one uploaded row
+def build_match_params(row, match_npi, match_first_name, match_last_name):
+    params = {
+        "version": "2.1",
+        "limit": 200  # Added the limit parameter here
+    }
 
-        if match_first_name and 'First Name' in row:
-            params["first_name"] = row.get('First Name', '')
+    if match_npi and 'NPI' in row:
+        params["number"] = row.get('NPI', '')
 
-        if match_last_name and 'Last Name' in row:
-            params["last_name"] = row.get('Last Name', '')
+    if match_first_name and 'First Name' in row:
+        params["first_name"] = row.get('First Name', '')
 
-        response_data = call_npi_api(params)
-        # Skip to the next row if the API response is empty or invalid
-        if not response_data:
-            result_data.append({**row, "NPI": "", "Name": "", "Primary Taxonomy": "", "Primary License": "", "Primary Practice Address": "", "Primary City": "", "Primary State": "", "API Email": ""})
-            continue
+    if match_last_name and 'Last Name' in row:
+        params["last_name"] = row.get('Last Name', '')
+
+    return params
+
+# Function to resolve an API response to a single output row
+def match_row(row, response_data, match_phone, match_area_code):
+    # Skip to the next row if the API response is empty or invalid
+    if not response_data:
+        return {**row, **EMPTY_MATCH}
+
+    # If the initial API call returns exactly one result, no need to filter by phone number
+    if response_data.get("result_count", 0) == 1:
+        extracted_info = extract_data(response_data)
+        if extracted_info:
+            return {**row, **extracted_info[0]}
+        return None
+
+    results = response_data.get("results", [])
+    # If more than one result, filter results by phone number or area code if necessary
+    if match_phone and 'Phone' in row:
+        phone = str(row.get('Phone', '')).strip()
+        exact_matches = []
+        area_code_matches = []
+        # A blank phone matches nothing (rather than every area code)
+        for result in (results if phone else []):
+            for address in result.addresses:
+                if address.telephone_number == phone:
+                    exact_matches.append(result)
+                    break  # Break out of the inner loop once an exact match is found
+                elif (address.telephone_number or "").startswith(phone[:3]):
+                    area_code_matches.append(result)
+                    break  # Break out of the inner loop once an area code match is found
 
-        # If the initial API call returns exactly one result, no need to filter by phone number
-        if response_data.get("result_count", 0) == 1:
-            extracted_info = extract_data(response_data)
-            if extracted_info:
-                result_data.append({**row, **extracted_info[0]})
+        if len(exact_matches) == 1:
+            results = exact_matches
+        elif len(area_code_matches) == 1 and not exact_matches:
+            results = area_code_matches
         else:
-            # If more than one result, filter results by phone number or area code if necessary
-            if match_phone and 'Phone' in row:
-                phone = str(row.get('Phone', '')).strip()
-                exact_matches = []
-                area_code_matches = []
-                for result in response_data.get("results", []):
-                    for address in result.get("addresses", []):
-                        if address.get("telephone_number") == phone:
-                            exact_matches.append(result)
-                            break  # Break out of the inner loop once an exact match is found
-                        elif address.get("telephone_number", "").startswith(phone[:3]):
-                            area_code_matches.append(result)
-                            break  # Break out of the inner loop once an area code match is found
-
-                if len(exact_matches) == 1:
-                    response_data["results"] = exact_matches
-                elif len(exact_matches) > 1:
-                    response_data["results"] = []
-                elif len(area_code_matches) == 1:
-                    response_data["results"] = area_code_matches
-                elif len(area_code_matches) > 1:
-                    response_data["results"] = []
-                else:
-                    response_data["results"] = []
-
-            # Check if we have exactly one result after filtering
-            if len(response_data.get("results", [])) == 1:
-                extracted_info = extract_data(response_data)
-                if extracted_info:
-                    result_data.append({**row, **extracted_info[0]})
-            else:
-                #result_data.append({**row, "NPI": "", "Name": "", "Primary Taxonomy": "", "Primary Practice Address": "", "Primary City": "", "Primary State": "", "API Email": ""})
-                result_data.append({**row, "NPI": "", "Name": "", "Primary Taxonomy": "", "Primary License": "", "Primary Practice Address": "", "Primary City": "", "Primary State": "", "API Email": ""})
+            results = []
 
-    
-    result_df = pd.DataFrame(result_data)
+    # Check if we have exactly one result after filtering
+    if len(results) == 1:
+        extracted_info = extract_data({"results": results})
+        if extracted_info:
+            return {**row, **extracted_info[0]}
+        return None
+    return {**row, **EMPTY_MATCH}
+
+# Function to normalize query parameters so equivalent rows share one API call
+def query_key(params):
+    return tuple(sorted((k, str(v).strip().upper()) for k, v in params.items()))
+
+# Function to group rows by their effective query: returns the distinct params and each row's group index
+def plan_queries(rows, match_npi, match_first_name, match_last_name):
+    queries = []
+    group_of_row = []
+    group_index = {}
+    for row in rows:
+        params = build_match_params(row, match_npi, match_first_name, match_last_name)
+        key = query_key(params)
+        if key not in group_index:
+            group_index[key] = len(queries)
+            queries.append(params)
+        group_of_row.append(group_index[key])
+    return queries, group_of_row
+
+# Distinct query responses kept between the chunks of one Match run (the most recently used ones),
+# so a query repeated in a later chunk is not sent again; about one upload batch worth of responses
+MATCH_SHARED_RESPONSES = 5000
+
+# Function to remember a run's responses by query_key, keeping the MATCH_SHARED_RESPONSES most recently used
+def share_responses(shared, keys, responses):
+    for key, response in zip(keys, responses):
+        # Failed lookups ({}) are not kept, so a later chunk asks again
+        if response:
+            shared.pop(key, None)
+            shared[key] = response
+    while len(shared) > MATCH_SHARED_RESPONSES:
+        del shared[next(iter(shared))]
+
+def process_file(file, match_npi, match_first_name, match_last_name, match_phone, match_area_code, max_workers=DEFAULT_MATCH_WORKERS, backend="api",
+                 score_ambiguous=False, min_score=npi_scoring.MIN_SCORE, min_margin=npi_scoring.MIN_MARGIN):
+    batches = npi_input.iter_input_batches(file)
+    return match_batches(batches, match_npi, match_first_name, match_last_name, match_phone, match_area_code, max_workers, backend,
+                         score_ambiguous, min_score, min_margin)
+
+# Function to match a stream of row batches and combine the results and their stats;
+# the batches share one response map, so a query is only sent once per upload
+def match_batches(batches, *args, **kwargs):
+    shared = {}
+    results = [match_dataframe(batch, *args, shared_responses=shared, **kwargs) for batch in batches]
+    result_df = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    for stat in ("rows", "api_calls", "calls_saved", "failed_lookups", "seconds"):
+        result_df.attrs[stat] = sum(result.attrs[stat] for result in results)
+    seconds = result_df.attrs["seconds"]
+    result_df.attrs["rows_per_second"] = result_df.attrs["rows"] / seconds if seconds > 0 else 0.0
     return result_df
 
+# Rows per chunk of a background Match job: results reach the page after each chunk
+MATCH_JOB_CHUNK_ROWS = 250
+
+# Function to run a Match as a background job, persisting each chunk's rows as soon as it is matched
+def run_match_job(job, df, *args, cache_mode=None, **kwargs):
+    _job_context.job = job
+    _job_context.cache_mode = cache_mode
+    try:
+        stats = dict.fromkeys(("rows", "api_calls", "calls_saved"), 0)
+        shared = {}
+        job.progress(0, len(df))
+        for start in range(0, len(df), MATCH_JOB_CHUNK_ROWS):
+            if job.cancelled:
+                break
+            result = match_dataframe(df.iloc[start:start + MATCH_JOB_CHUNK_ROWS], *args, shared_responses=shared, **kwargs)
+            job.add_rows(result.to_dict("records"))
+            for stat in stats:
+                stats[stat] += result.attrs[stat]
+            job.stats = dict(stats)
+            job.progress(min(start + MATCH_JOB_CHUNK_ROWS, len(df)))
+    finally:
+        _job_context.job = None
+        _job_context.cache_mode = None
+
+# Function to build the result DataFrame of a finished Match job, with the same stats as match_dataframe
+def match_job_frame(job):
+    result_df = pd.DataFrame(job.preview, columns=job.columns)
+    for stat in ("rows", "api_calls", "calls_saved"):
+        result_df.attrs[stat] = job.stats.get(stat, 0)
+    seconds = job.finished - job.started
+    result_df.attrs["seconds"] = seconds
+    result_df.attrs["rows_per_second"] = result_df.attrs["rows"] / seconds if seconds > 0 else 0.0
+    return result_df
+
+# Function to match the rows of an already loaded DataFrame (one chunk of an upload, or all of it);
+# shared_responses carries responses between the chunks of one run (see share_responses)
+def match_dataframe(df, match_npi, match_first_name, match_last_name, match_phone, match_area_code, max_workers=DEFAULT_MATCH_WORKERS, backend="api",
+                    score_ambiguous=False, min_score=npi_scoring.MIN_SCORE, min_margin=npi_scoring.MIN_MARGIN, shared_responses=None):
+    rows = df.to_dict("records")
+    started = time.perf_counter()
+
+    # Planning stage: each distinct query runs once, its response is shared by every row in the group
+    queries, group_of_row = plan_queries(rows, match_npi, match_first_name, match_last_name)
+    keys = [query_key(params) for params in queries]
+    shared = {} if shared_responses is None else shared_responses
+    responses = [shared.get(key) for key in keys]
+    missing = [group for group, response in enumerate(responses) if response is None]
+
+    # executor.map yields results in submission order, so responses line up with queries
+    # Worker threads get the script context (or job) so warnings still reach the page
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers)), initializer=script_ctx_initializer()) as executor:
+        for group, response in zip(missing, executor.map(lambda group: call_npi_api(queries[group], backend), missing)):
+            responses[group] = response
+    share_responses(shared, keys, responses)
+
+    # Fan out: apply each row's own phone/area-code filter to its group's response, in input order
+    result_data = []
+    ambiguous = []  # (position in result_data, row, candidates) for rows the rules left unresolved
+    with metrics.timed("match_filter"):
+        for row, group in zip(rows, group_of_row):
+            matched = match_row(row, responses[group], match_phone, match_area_code)
+            if matched is None:
+                continue
+            candidates = responses[group].get("results", []) if responses[group] else []
+            if score_ambiguous:
+                matched = {**matched, "Match Score": "", "Runner-up Margin": ""}
+                if matched["NPI"] == "" and len(candidates) > 1:
+                    ambiguous.append((len(result_data), row, candidates))
+            result_data.append(matched)
+
+    # Scoring stage: rank every candidate of every ambiguous row in one vectorized pass
+    if ambiguous:
+        with metrics.timed("scoring"):
+            scored = npi_scoring.score_candidates([row for _, row, _ in ambiguous], [candidates for _, _, candidates in ambiguous])
+            for index, (candidate, score, margin) in npi_scoring.pick_best(scored, min_score, min_margin).items():
+                position, row, candidates = ambiguous[index]
+                extracted_info = extract_data({"results": [candidates[candidate]]})
+                result_data[position] = {**row, **extracted_info[0], "Match Score": round(score, 3), "Runner-up Margin": round(margin, 3)}
+
+    with metrics.timed("dataframe_build"):
+        result_df = pd.DataFrame(result_data)
+    elapsed = time.perf_counter() - started
+    result_df.attrs["rows"] = len(rows)
+    result_df.attrs["api_calls"] = len(missing)
+    result_df.attrs["calls_saved"] = len(rows) - len(missing)
+    # Lookups that still failed after retries (call_npi_api returned {}); their rows are unmatched
+    result_df.attrs["failed_lookups"] = sum(not response for response in responses)
+    result_df.attrs["seconds"] = elapsed
+    result_df.attrs["rows_per_second"] = len(rows) / elapsed if elapsed > 0 else 0.0
+    return result_df
+
+
+# Registry API paging limits: at most 200 results per call and a skip of at most 1000
+SEARCH_PAGE_LIMIT = 200
+SEARCH_MAX_SKIP = 1000
+
+# Default number of Search sub-queries run in parallel
+DEFAULT_SEARCH_WORKERS = 8
+
+# Function to fetch every page of one registry query; returns (results, capped) where capped
+# means the skip limit was reached with full pages, so results may be missing
+def search_all_pages(params, backend="api"):
+    results = []
+    for skip in range(0, SEARCH_MAX_SKIP + 1, SEARCH_PAGE_LIMIT):
+        data = call_npi_api({**params, "limit": SEARCH_PAGE_LIMIT, "skip": skip}, backend)
+        page = data.get("results", []) if data else []
+        results.extend(page)
+        if len(page) < SEARCH_PAGE_LIMIT:
+            return results, False
+    return results, True
+
+# Function to narrow a capped query by one more postal-code digit; [] when it can't be split further
+def split_search_query(params):
+    postal_code = str(params.get("postal_code") or "").strip()
+    if not postal_code:
+        # Wildcards need at least 2 characters before the *
+        return [{**params, "postal_code": f"{prefix:02d}*"} for prefix in range(100)]
+    if postal_code.endswith("*") and postal_code[:-1].isdigit():
+        prefix = postal_code[:-1]
+        if len(prefix) == 4:
+            return [{**params, "postal_code": f"{prefix}{digit}"} for digit in range(10)]
+        return [{**params, "postal_code": f"{prefix}{digit}*"} for digit in range(10)]
+    return []
+
+# Function to run a Search query to completion: pages with skip, splits capped queries into
+# postal-code sub-queries run in parallel, and de-duplicates by NPI
+def search_npi_all(params, backend="api", max_workers=DEFAULT_SEARCH_WORKERS, progress=None):
+    seen = set()
+    merged = []
+    truncated = []
+    level = [params]
+    done = total = 0
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers)), initializer=script_ctx_initializer()) as executor:
+        while level:
+            total += len(level)
+            futures = [executor.submit(search_all_pages, query, backend) for query in level]
+            for future in as_completed(futures):
+                done += 1
+                if progress:
+                    progress(done, total)
+            next_level = []
+            # Merge in query order so the output is deterministic
+            for query, future in zip(level, futures):
+                results, capped = future.result()
+                if capped:
+                    narrower = split_search_query(query)
+                    if narrower:
+                        next_level.extend(narrower)
+                        continue
+                    truncated.append(query)
+                for result in results:
+                    number = result.number
+                    if number not in seen:
+                        seen.add(number)
+                        merged.append(result)
+            level = next_level
+    return {"result_count": len(merged), "results": merged, "truncated_queries": truncated, "sub_queries": total}
+
+# Function to parse an uploaded file once per distinct content
+@st.cache_data(max_entries=4, show_spinner="Reading upload...")
+def load_upload(content, file_name):
+    return npi_input.read_input(BytesIO(content), file_name=file_name)
+
+# Rows per page offered by render_results
+RESULT_PAGE_SIZES = [25, 50, 100]
+
+# Function to show a result DataFrame one page at a time, with server-side filtering and sorting
+def render_results(df, key):
+    if df.empty:
+        st.write("No results.")
+        return
+    columns = df.columns.tolist()
+    col1, col2, col3, col4 = st.columns([2, 3, 2, 1])
+    with col1:
+        filter_column = st.selectbox("Filter column", columns, key=f"{key}_filter_column")
+    with col2:
+        filter_text = st.text_input("Contains", key=f"{key}_filter_text")
+    with col3:
+        sort_column = st.selectbox("Sort by", ["(input order)"] + columns, key=f"{key}_sort_column")
+    with col4:
+        ascending = st.checkbox("Ascending", value=True, key=f"{key}_ascending")
+
+    view = df
+    if filter_text:
+        values = view[filter_column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Dictionary-encoded columns: test each distinct value once, then select rows by code
+            categories = values.cat.categories
+            view = view[values.isin(categories[categories.astype(str).str.contains(filter_text, case=False, regex=False)])]
+        else:
+            view = view[values.astype(str).str.contains(filter_text, case=False, regex=False)]
+    if sort_column != "(input order)":
+        view = view.sort_values(sort_column, ascending=ascending, kind="stable")
+
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        page_size = st.selectbox("Rows per page", RESULT_PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-len(view) // page_size))
+    with col2:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    start = (min(page, pages) - 1) * page_size
+    st.write(f"Showing rows {min(start + 1, len(view))}-{min(start + page_size, len(view))} of {len(view)}")
+    # Only the current page is rendered, so st.table keeps wrapped text without freezing the browser
+    st.table(view.iloc[start:start + page_size])
+
+# Seconds between page refreshes while a background job is queued or running
+JOB_POLL_SECONDS = 1.0
+
+# Function to show a background job's state, progress, warnings, partial download and cancel button;
+# returns True while the job is still queued or running
+def render_job(job, key):
+    if job.status == "queued":
+        st.info("Queued: waiting for a free worker.")
+    elif job.status == "running":
+        st.progress(min(1.0, job.done / job.total) if job.total else 0.0)
+        if st.button("Cancel", key=f"{key}_cancel"):
+            job.cancel()
+    elif job.status == "failed":
+        st.error(f"Job failed: {job.error}")
+    elif job.status == "cancelled":
+        st.warning("Job cancelled; the rows below are what completed before it stopped.")
+
+    for message in job.warnings[:10]:
+        st.warning(message)
+    if len(job.warnings) > 10:
+        st.warning(f"... and {len(job.warnings) - 10} more warnings")
+
+    if job.first_result is not None:
+        st.write(f"{job.rows} rows{'' if job.status == 'done' else ' so far'} (first rows after {job.first_result - job.started:.1f}s)")
+        if job.status != "done":
+            # The spool is read on request only, not on every poll
+            if st.button("Prepare download of rows so far", key=f"{key}_partial_prepare"):
+                st.session_state[f"{key}_partial"] = (job.id, job.partial_csv())
+            partial = st.session_state.get(f"{key}_partial")
+            if partial is not None and partial[0] == job.id:
+                st.download_button("Download rows so far (CSV)", partial[1], file_name=f"npi_{key}_partial.csv",
+                                   mime="text/csv", key=f"{key}_partial_download")
+    return not job.is_finished
+
+# Function to show request and stage metrics in the sidebar, with JSON and Prometheus exports
+def render_metrics_panel():
+    snapshot = metrics.snapshot()
+    with st.expander("Metrics"):
+        if snapshot["endpoints"]:
+            st.markdown("**Requests by endpoint**")
+            st.table(pd.DataFrame([
+                {"Endpoint": name, "Requests": entry["requests"], "Errors": entry["errors"], "Retries": entry["retries"],
+                 "KB": round(entry["bytes"] / 1024, 1), "Cache hits": entry["cache_hits"], "Cache misses": entry["cache_misses"],
+                 "p50 s": entry["latency"]["p50"], "p99 s": entry["latency"]["p99"]}
+                for name, entry in snapshot["endpoints"].items()
+            ]).set_index("Endpoint"))
+        if snapshot["stages"]:
+            st.markdown("**Stages**")
+            st.table(pd.DataFrame([
+                {"Stage": name, "Calls": stage["count"], "Total s": round(stage["sum"], 3), "p50 s": stage["p50"], "p99 s": stage["p99"]}
+                for name, stage in snapshot["stages"].items()
+            ]).set_index("Stage"))
+        limiters = npi_ratelimit.stats()
+        if limiters:
+            st.markdown("**Rate limits (shared by all sessions)**")
+            st.table(pd.DataFrame([
+                {"Host": host, "Concurrency limit": s["limit"], "In flight": s["in_flight"], "Rate /s": s["rate"], "Throttled": s["throttled"]}
+                for host, s in limiters.items()
+            ]).set_index("Host"))
+        jobs = npi_jobs.get_runner().stats()
+        if any(jobs.values()):
+            st.markdown("**Background jobs (all sessions)**")
+            st.table(pd.DataFrame([jobs], index=["Jobs"]))
+        st.download_button("Export JSON", metrics.to_json(), file_name="npi_metrics.json", mime="application/json")
+        st.download_button("Export Prometheus", metrics.to_prometheus(), file_name="npi_metrics.prom", mime="text/plain")
+        if st.button("Reset metrics"):
+            metrics.reset()
 
 # Streamlit app
 def main():
@@ -351,6 +950,27 @@ def main():
         unsafe_allow_html=True
     )
 
+    # Response cache controls
+    cache = npi_cache.get_cache()
+    with st.sidebar:
+        st.subheader("Lookup Backend")
+        local_available = os.path.exists(nppes_index.INDEX_PATH)
+        backend = st.radio("Search and Match using", BACKENDS if local_available else BACKENDS[:1],
+                           format_func=lambda name: "NPPES API" if name == "api" else "Local NPPES index",
+                           help=f"Build the local index with: python -m nppes_index ingest <npidata_pfile.csv> --db {nppes_index.INDEX_PATH}")
+        st.subheader("Response Cache")
+        # The mode belongs to this session; the shared cache keeps its default for everyone else
+        _job_context.cache_mode = st.radio("Cache mode", npi_cache.CACHE_MODES, index=npi_cache.CACHE_MODES.index(cache.mode),
+                                           key="cache_mode",
+                                           help="'only' answers from the cache and never calls the APIs (offline re-runs)")
+        stats = cache.stats()
+        if stats["error"]:
+            st.warning(f"Response cache unavailable, calling the APIs directly: {stats['error']}")
+        st.write(f"Entries: {stats['entries']} ({stats['bytes'] / 2**20:.0f} MiB) | Hits: {stats['hits']} | Misses: {stats['misses']}")
+        if st.button("Clear cache"):
+            cache.clear()
+        render_metrics_panel()
+
     # Placeholder for the styled label
     st.markdown('<div class="radio-label">Select Mode</div>', unsafe_allow_html=True)
 
@@ -363,7 +983,7 @@ def main():
     ***Note: Match will be Done for rows where the result's are just one record***
     
     **Match NPI** allows you to:
-    - **Upload an Excel file** with columns such as NPI, First Name, Last Name, and Phone.
+    - **Upload an Excel, CSV or Parquet file** with columns such as NPI, First Name, Last Name, and Phone.
     - **Select criteria** for matching NPI using various fields available in your Excel file.
     - **Match using NPI**: Directly match the NPI number if available in your data.
     - **Match using First Name and Last Name**: Use these fields to find potential matches.
@@ -380,12 +1000,17 @@ def main():
     - Primary State
     - API Emails
     
-    ***If multiple matches are found, the record will be skipped to ensure accuracy***.
+    ***If multiple matches are found, the record will be skipped to ensure accuracy***,
+    unless **Score ambiguous matches** is enabled: the best-scoring candidate is then kept when it clears the
+    score and runner-up margin thresholds, and both values are written to the output.
     """)
-        uploaded_file = st.file_uploader("Choose an Excel file", type="xlsx")
+        uploaded_file = st.file_uploader("Choose an Excel, CSV or Parquet file", type=npi_input.INPUT_TYPES)
         
         if uploaded_file is not None:
-            df = pd.read_excel(uploaded_file, engine='openpyxl')
+            # Parsed once per distinct upload and reused across reruns
+            content = uploaded_file.getvalue()
+            upload_hash = hashlib.sha256(content).hexdigest()
+            df = load_upload(content, uploaded_file.name)
             
             available_columns = df.columns.tolist()
             
@@ -395,21 +1020,66 @@ def main():
             match_last_name = 'Last Name' in available_columns and st.checkbox("Match by Last Name")
             match_phone = 'Phone' in available_columns and st.checkbox("Match by Phone Number")
             match_area_code = match_phone and st.checkbox("Match by Area Code (if no exact match found)")
+            max_workers = st.number_input("Parallel lookups", min_value=1, max_value=32, value=DEFAULT_MATCH_WORKERS, step=1)
+            score_ambiguous = st.checkbox("Score ambiguous matches instead of skipping them",
+                                          help="Ranks all candidates by phone, name, city/state and taxonomy (uses Middle Name, City, State and Taxonomy columns when present)")
+            min_score, min_margin = npi_scoring.MIN_SCORE, npi_scoring.MIN_MARGIN
+            if score_ambiguous:
+                col1, col2 = st.columns(2)
+                with col1:
+                    min_score = st.slider("Minimum score", 0.0, 1.0, npi_scoring.MIN_SCORE, 0.05)
+                with col2:
+                    min_margin = st.slider("Minimum margin over runner-up", 0.0, 1.0, npi_scoring.MIN_MARGIN, 0.05)
 
+            # Results are memoized by upload content and match options
+            match_key = (upload_hash, match_npi, match_first_name, match_last_name, match_phone, match_area_code,
+                         backend, score_ambiguous, min_score, min_margin)
+            # Matching runs as a background job; the page polls it and shows rows as chunks complete
+            runner = npi_jobs.get_runner()
             if st.button("Match NPI"):
-                result_df = process_file(uploaded_file, match_npi, match_first_name, match_last_name, match_phone, match_area_code)
-                st.table(result_df)  # Use st.table to display the result DataFrame with wrapped text
-
-                # Create a download button
-                buffer = BytesIO()
-                with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                    result_df.to_excel(writer, index=False)
-                st.download_button(
-                    label="Download data as Excel",
-                    data=buffer,
-                    file_name="matched_npi_results.xlsx",
-                    mime="application/vnd.ms-excel"
-                )
+                stored = st.session_state.get("match_job")
+                job = runner.get(stored["job"]) if stored else None
+                if job is None or stored["key"] != match_key or job.status in ("failed", "cancelled"):
+                    if stored:
+                        runner.discard(stored["job"])
+                    job = runner.submit(npi_jobs.Job("match"), run_match_job, df, match_npi, match_first_name, match_last_name, match_phone, match_area_code,
+                                        max_workers=max_workers, backend=backend, score_ambiguous=score_ambiguous, min_score=min_score, min_margin=min_margin,
+                                        cache_mode=cache_mode())
+                    st.session_state["match_job"] = {"key": match_key, "upload": upload_hash, "job": job.id, "df": None}
+
+            stored = st.session_state.get("match_job")
+            job = runner.get(stored["job"]) if stored is not None and stored["upload"] == upload_hash else None
+            if job is not None:
+                if stored["key"] != match_key:
+                    st.info("Showing results for the previous options; press Match NPI to re-run.")
+                active = render_job(job, "match")
+                if job.status == "done":
+                    if stored["df"] is None:
+                        stored["df"] = match_job_frame(job)
+                    result_df = stored["df"]
+                    st.write(f"Matched {result_df.attrs['rows']} rows in {result_df.attrs['seconds']:.1f}s ({result_df.attrs['rows_per_second']:.1f} rows/s)")
+                    st.write(f"API calls: {result_df.attrs['api_calls']} ({result_df.attrs['calls_saved']} saved by de-duplicating identical queries)")
+
+                    # Create a download button (each format is written to a temp file once per result; the
+                    # job owns the file, so it goes when the job is discarded or expires)
+                    export_format = st.selectbox("Download format", list(npi_export.FORMATS), key="match_format")
+                    export_path = job.exports.get(export_format)
+                    if export_path is None:
+                        export_path = job.add_export(export_format, npi_export.export_dataframe(result_df, export_format))
+                    _, extension, mime = npi_export.FORMATS[export_format]
+                    with open(export_path, "rb") as export_file:
+                        st.download_button(
+                            label=f"Download data as {export_format}",
+                            data=export_file,
+                            file_name=f"matched_npi_results{extension}",
+                            mime=mime
+                        )
+                    render_results(result_df, "match")
+                elif job.preview:
+                    render_results(pd.DataFrame(list(job.preview), columns=job.columns), "match")
+                if active:
+                    time.sleep(JOB_POLL_SECONDS)
+                    st.rerun()
     
     # Helper function to create input row with description
     def input_row(label, input_widget, description, key):
@@ -450,23 +1120,30 @@ def main():
                 "city": city,
                 "state": state,
                 "postal_code": postal_code,
-                "limit": 200,  # Added the limit parameter here
-                "pretty": "true"
             }
 
-            # Call the API
-            data = call_npi_api(params)
+            # Call the API, paging past the 200-result cap and splitting queries that still hit it
+            status = st.empty()
+            bar = st.progress(0.0)
+            def show_progress(done, total):
+                bar.progress(done / total)
+                status.write(f"Sub-queries completed: {done} of {total}")
+            data = search_npi_all(params, backend, progress=show_progress)
+            if data["truncated_queries"]:
+                st.warning(f"{len(data['truncated_queries'])} sub-queries still hit the registry's 1,200-result cap; narrow the search to see every match.")
 
-            # Extract and display the results in a table
+            # Extract the results; kept in the session so paging and filtering don't re-query
             extracted_data = extract_data(data)
-            df = pd.DataFrame(extracted_data)
+            with metrics.timed("dataframe_build"):
+                df = pd.DataFrame(extracted_data)
             # Reset the index and add a new "S.No" column starting from 1
             # Reset the index and drop it
             df.index.name = 'Sr.No'
             df.index +=1
-            
-            # Display the DataFrame using st.table for wrapped text
-            st.table(df)
+            st.session_state["search_results"] = df
+
+        if "search_results" in st.session_state:
+            render_results(st.session_state["search_results"], "search")
     
     if mode == "***Extract NPI Data***":
         entity_type = st.radio("Select Entity Type", ['Organization', 'Individual', 'All'])
@@ -483,50 +1160,85 @@ def main():
         taxonomy_codes = st.text_area("Enter Taxonomy Codes (one per line):", "")
         taxonomy_list = [code.strip() for code in taxonomy_codes.split("\n") if code.strip()]
         
-        # Step 4: Once user submits, process each taxonomy code
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            page_size = st.number_input("Page size", min_value=1, max_value=MAX_PAGE_SIZE, value=MAX_PAGE_SIZE, step=50)
+        with col2:
+            page_workers = st.number_input("Parallel page requests", min_value=1, max_value=16, value=DEFAULT_PAGE_WORKERS, step=1)
+        with col3:
+            batch_size = st.number_input("Codes per query", min_value=1, max_value=50, value=TAXONOMY_BATCH_SIZE, step=1,
+                                         help="Taxonomy codes combined into one search with OR")
+        with col4:
+            export_format = st.selectbox("Output format", list(npi_export.FORMATS),
+                                         help="xlsx starts a new sheet every 1,048,576 rows; parquet needs pyarrow")
+
+        # Step 4: Once user submits, queue the extract as a background job
+        runner = npi_jobs.get_runner()
         if st.button("Fetch Data"):
             if not taxonomy_list:
                 st.warning("Please enter at least one taxonomy code.")
             else:
-                all_results = []
-                for taxonomy_code in taxonomy_list:
-                    st.write(f"Fetching data for taxonomy code: {taxonomy_code}")
-                    
-                    if entity_type in ['Individual', 'All']:
-                        individual_data = fetch_npi_data(taxonomy_code, 'individual')
-                        if individual_data:
-                            all_results.extend(individual_data)
-                            st.write(f"Number of Records extracted for taxonomy code {taxonomy_code} individual: {len(individual_data)}")
-
-                    if entity_type in ['Organization', 'All']:
-                        organization_data = fetch_npi_data(taxonomy_code, 'organization')
-                        if organization_data:
-                            all_results.extend(organization_data)
-                            st.write(f"Number of Records extracted for taxonomy code {taxonomy_code} organization: {len(organization_data)}")
-
-                
-                # Step 5: Display the data in a table if data exists
-                if all_results:
-                    df = pd.DataFrame(all_results, columns=[
-                        'NPI', 'Name', 'Provider Type', 'Taxonomy Code', 
-                        'Taxonomy Grouping', 'Taxonomy Classification',
-                        'Taxonomy Specialization', 'Address', 
-                        'City', 'State',
-                        'ZIP Code', 'Phone', 'Country', 
-                        'Credential','Entity Type'
-                    ])
-
-                    # Download button
+                entity_types = []
+                if entity_type in ['Individual', 'All']:
+                    entity_types.append('individual')
+                if entity_type in ['Organization', 'All']:
+                    entity_types.append('organization')
+                taxonomy_list = list(dict.fromkeys(taxonomy_list))
+                batches = plan_taxonomy_batches(taxonomy_list, batch_size)
+                st.write(f"Fetching data for taxonomy codes: {', '.join(taxonomy_list)} "
+                         f"({len(batches) * len(entity_types)} queries)")
+
+                # Replace the previous extract job and its files, if any
+                previous = st.session_state.pop("extract_job", None)
+                if previous:
+                    runner.discard(previous)
+
+                # Batches run in parallel; pages stream to a temp file in batch, then entity type order,
+                # and a provider holding several of the codes is written once
+                job = runner.submit(npi_jobs.Job("extract", export_format, EXTRACT_PREVIEW_ROWS, npi_store.ResultStore(EXTRACT_OUTPUT_COLUMNS)), run_extract_job,
+                                    taxonomy_list, entity_types, page_size, page_workers, batch_size, cache_mode())
+                st.session_state["extract_job"] = job.id
+
+        # Jobs survive reruns, so paging the preview does not re-fetch anything
+        job = runner.get(st.session_state["extract_job"]) if "extract_job" in st.session_state else None
+        if job is not None:
+            active = render_job(job, "extract")
+            for (taxonomy_code, entity), n in job.stats.get("counts", {}).items():
+                st.write(f"Number of Records extracted for taxonomy code {taxonomy_code} {entity}: {n}")
+            st.write(f"Unique providers: {job.rows} (providers holding several of the codes appear once)")
+
+            # Step 5: Display the data in a table if data exists
+            if job.status == "done" and job.rows:
+                # Download button
+                _, extension, mime = npi_export.FORMATS[job.export_format]
+                with open(job.export_path, "rb") as extract_file:
                     st.download_button(
-                        label="Download data as Excel",
-                        data=download_dataframe_as_excel(df),
-                        file_name="npi_data_extract.xlsx",
-                        mime="application/vnd.ms-excel"
+                        label=f"Download data as {job.export_format}",
+                        data=extract_file,
+                        file_name=f"npi_data_extract{extension}",
+                        mime=mime
                     )
+            elif job.status == "done":
+                st.write("No data found.")
 
-                    st.dataframe(df)
-                else:
-                    st.write("No data found.")
+            if job.is_finished and job.rows:
+                # The whole extract is kept in the compact result store, so it can be filtered and sorted in full;
+                # it is converted once and then released, so the session holds the frame only
+                stored = st.session_state.get("extract_frame")
+                if stored is None or stored[0] != job.id:
+                    stored = st.session_state["extract_frame"] = (job.id, job.store.to_frame(), job.store.nbytes(),
+                                                                  job.store.bytes_per_record())
+                    job.store = None
+                st.write(f"Result store: {stored[2] / 2**20:.1f} MB ({stored[3]:.0f} bytes per record)")
+                render_results(stored[1], "extract")
+            elif job.preview:
+                preview = pd.DataFrame(list(job.preview), columns=EXTRACT_OUTPUT_COLUMNS)
+                if job.rows > len(preview):
+                    st.write(f"Showing the first {len(preview)} of {job.rows} records so far.")
+                render_results(preview, "extract")
+            if active:
+                time.sleep(JOB_POLL_SECONDS)
+                st.rerun()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
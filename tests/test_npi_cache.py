@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+import npi_cache
+
+
+def test_unopenable_cache_falls_back_to_fetch(tmp_path):
+    cache = npi_cache.ResponseCache(str(tmp_path / "missing" / "cache.sqlite"), mode="on")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return '{"ok": true}'
+
+    assert cache.get_or_fetch("https://example.test/api/", {"a": 1}, fetch) == {"ok": True}
+    assert cache.get_or_fetch("https://example.test/api/", {"a": 1}, fetch) == {"ok": True}
+    assert len(calls) == 2
+    stats = cache.stats()
+    assert stats["error"] and stats["entries"] == 0
+    with pytest.raises(npi_cache.CacheMiss, match="cache unavailable"):
+        cache.get_or_fetch("https://example.test/api/", {"a": 1}, fetch, mode="only")
+    cache.clear()
+
+
+def test_off_mode_never_opens_the_database(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = npi_cache.ResponseCache(str(path), mode="off")
+    assert cache.get_or_fetch("https://example.test/api/", None, lambda: "[1]") == [1]
+    assert cache.stats()["entries"] == 0
+    assert not path.exists()
+
+
+def test_totals_and_byte_cap(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = npi_cache.ResponseCache(path, max_entries=100, max_bytes=1000, mode="on")
+    for i in range(50):
+        cache.put(f"k{i}", "x" * 100)
+    cache.put("k49", "é" * 10)  # replacing an entry swaps its size: 10 characters, 20 bytes
+    on_disk = sqlite3.connect(path).execute(
+        "SELECT COUNT(*), SUM(LENGTH(CAST(body AS BLOB))) FROM responses").fetchone()
+    assert (cache.entries, cache.bytes) == on_disk
+    assert cache.bytes <= 1000
+    # Least recently used entries went first
+    assert cache.get("k0") is None and cache.get("k49") == "é" * 10
+
+    reopened = npi_cache.ResponseCache(path)
+    assert reopened.stats()["entries"] == cache.entries
@@ -0,0 +1,110 @@
+import csv
+import json
+import logging
+import os
+
+import pytest
+import requests
+
+import npi_cli
+import streamlit_app
+
+TOTAL_RECORDS = 6
+
+
+# clinicaltables response for one page of the fake registry (NPIs 1000000000 up)
+def clinicaltables_page(offset, count):
+    npis = [str(1000000000 + n) for n in range(offset, min(offset + count, TOTAL_RECORDS))]
+    fields = {field: [f"{field} {npi}" for npi in npis] for field in (
+        "name.full", "provider_type", "addr_practice.full", "addr_practice.city", "addr_practice.state",
+        "addr_practice.zip", "addr_practice.phone", "addr_practice.country", "name.credential")}
+    fields["NPI"] = npis
+    fields["licenses"] = [[{"taxonomy": {"code": "A"}, "is_primary_taxonomy": "Y"}] for _ in npis]
+    return [TOTAL_RECORDS, npis, fields]
+
+
+class FakeApi:
+    """Stands in for npi_client.get_json; requests listed in `failing` raise like an exhausted retry."""
+
+    def __init__(self):
+        self.failing = set()
+        self.requests = []
+
+    def get_json(self, url, params=None, decode=json.loads, cache_mode=None, **kwargs):
+        if "offset" in params:
+            self.requests.append(params["offset"])
+            if params["offset"] in self.failing:
+                raise requests.exceptions.ConnectionError("connection reset")
+            return clinicaltables_page(params["offset"], params["count"])
+        self.requests.append(params["last_name"])
+        if params["last_name"] in self.failing:
+            raise requests.exceptions.ConnectionError("connection reset")
+        number = str(1000000000 + int(params["last_name"][1:]))
+        return decode(json.dumps({"result_count": 1, "results": [{"number": number, "basic": {"last_name": params["last_name"]}}]}))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakeApi()
+    monkeypatch.setattr(streamlit_app.npi_client, "get_json", fake.get_json)
+    return fake
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def extract(output):
+    npi_cli.main(["extract", str(output), "A", "--entity", "individual", "--page-size", "2", "--workers", "1"])
+
+
+def test_extract_stops_at_failed_page_and_resumes_it(api, tmp_path):
+    output = tmp_path / "extract.csv"
+    api.failing = {2}
+    with pytest.raises(SystemExit) as exited:
+        extract(output)
+    assert exited.value.code != 0 and "offset 2" in str(exited.value.code)
+    checkpoint = json.loads((tmp_path / "extract.csv.checkpoint" / "checkpoint.json").read_text())
+    assert (checkpoint["pair_index"], checkpoint["pages_done"]) == (0, 1)
+    assert len(read_csv(output)) == 2
+
+    api.failing, api.requests = set(), []
+    extract(output)
+    assert api.requests == [2, 4]
+    assert [row["NPI"] for row in read_csv(output)] == [str(1000000000 + n) for n in range(TOTAL_RECORDS)]
+    assert not os.path.exists(tmp_path / "extract.csv.checkpoint")
+
+
+def test_extract_failed_first_page_is_not_skipped(api, tmp_path):
+    output = tmp_path / "extract.csv"
+    api.failing = {0}
+    with pytest.raises(SystemExit):
+        extract(output)
+
+    api.failing, api.requests = set(), []
+    extract(output)
+    assert api.requests == [0, 2, 4]
+    assert len(read_csv(output)) == TOTAL_RECORDS
+
+
+def test_match_leaves_failed_chunk_for_resume(api, tmp_path, caplog):
+    roster = tmp_path / "roster.csv"
+    roster.write_text("First Name,Last Name\nA,L1\nB,L2\nC,L3\nD,L4\n")
+    output = tmp_path / "matched.csv"
+    command = ["match", str(roster), str(output), "--first-name", "--last-name", "--chunk-size", "2", "--workers", "1"]
+
+    api.failing = {"L3"}
+    with caplog.at_level(logging.WARNING), pytest.raises(SystemExit) as exited:
+        npi_cli.main(command)
+    assert "1 of 2 chunks" in str(exited.value.code)
+    # warn() has no Streamlit session here, so the failure is logged
+    assert "connection reset" in caplog.text
+    checkpoint = json.loads((tmp_path / "matched.csv.checkpoint" / "checkpoint.json").read_text())
+    assert checkpoint["chunks_done"] == [0]
+    assert not output.exists()
+
+    api.failing, api.requests = set(), []
+    npi_cli.main(command)
+    assert api.requests == ["L3", "L4"]
+    assert [row["NPI"] for row in read_csv(output)] == ["1000000001", "1000000002", "1000000003", "1000000004"]
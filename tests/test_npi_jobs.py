@@ -0,0 +1,39 @@
+import os
+
+import npi_jobs
+
+
+def write_rows(job):
+    job.add_rows([{"NPI": "1234567893", "Name": "A"}])
+
+
+def finished_job(runner, tmp_path, fmt):
+    job = runner.submit(npi_jobs.Job("match"), write_rows)
+    runner.executor.shutdown(wait=True)
+    assert job.status == "done"
+    export = tmp_path / f"export.{fmt}"
+    export.write_text("NPI\n1234567893\n")
+    assert job.add_export(fmt, str(export)) == str(export)
+    return job, export
+
+
+def test_discard_removes_exported_files(tmp_path):
+    runner = npi_jobs.JobRunner(max_workers=1)
+    job, export = finished_job(runner, tmp_path, "csv")
+    runner.discard(job.id)
+    assert not export.exists()
+    assert not os.path.exists(job.spool_path)
+    # A file exported after the job's files were removed goes straight away
+    late = tmp_path / "late.xlsx"
+    late.write_text("")
+    job.add_export("xlsx", str(late))
+    assert not late.exists()
+
+
+def test_prune_removes_expired_exports(tmp_path, monkeypatch):
+    runner = npi_jobs.JobRunner(max_workers=1)
+    job, export = finished_job(runner, tmp_path, "parquet")
+    monkeypatch.setattr(npi_jobs, "JOB_RETENTION", -1)
+    runner.prune()
+    assert runner.get(job.id) is None
+    assert not export.exists()
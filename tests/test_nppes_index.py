@@ -0,0 +1,76 @@
+import csv
+
+import pytest
+
+import nppes_index
+
+PROVIDERS = [
+    {"NPI": "1000000001", "Entity Type Code": "1", "Provider First Name": "ANN", "Provider Last Name (Legal Name)": "SMITH",
+     "Provider Business Practice Location Address City Name": "FRESNO",
+     "Provider Business Practice Location Address State Name": "CA",
+     "Provider Business Practice Location Address Postal Code": "937211234",
+     "Provider Business Practice Location Address Telephone Number": "5595551234",
+     "Healthcare Provider Taxonomy Code_1": "207Q00000X", "Provider License Number_1": "A123",
+     "Provider License Number State Code_1": "CA", "Healthcare Provider Primary Taxonomy Switch_1": "Y"},
+    {"NPI": "1000000002", "Entity Type Code": "2",
+     "Provider Organization Name (Legal Business Name)": "VALLEY CLINIC",
+     "Provider Business Practice Location Address City Name": "RENO",
+     "Provider Business Practice Location Address State Name": "NV",
+     "Provider Business Practice Location Address Postal Code": "89501"},
+    # Deactivated NPIs carry no entity type and are skipped
+    {"NPI": "1000000003"},
+]
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("nppes")
+    header = ["NPI", "Entity Type Code"] + list(nppes_index.SOURCE_COLUMNS.values()) + [
+        f"{name}_{slot}"
+        for slot in range(1, nppes_index.TAXONOMY_SLOTS + 1)
+        for name in ("Healthcare Provider Taxonomy Code", "Provider License Number",
+                     "Provider License Number State Code", "Healthcare Provider Primary Taxonomy Switch")
+    ]
+    csv_path = tmp / "npidata_pfile.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=header, restval="")
+        writer.writeheader()
+        writer.writerows(PROVIDERS)
+    taxonomy_path = tmp / "nucc_taxonomy.csv"
+    taxonomy_path.write_text("Code,Display Name\n207Q00000X,Family Medicine Physician\n", encoding="utf-8")
+
+    db_path = str(tmp / "nppes.sqlite")
+    assert nppes_index.ingest(str(csv_path), db_path, taxonomy_file=str(taxonomy_path)) == 2
+    return nppes_index.NppesIndex(db_path)
+
+
+def test_search_returns_registry_shape(index):
+    data = index.search({"last_name": "smith", "state": "ca"})
+    assert data["result_count"] == 1
+    result = data["results"][0]
+    assert result["number"] == "1000000001"
+    assert result["enumeration_type"] == "NPI-1"
+    assert result["basic"]["first_name"] == "ANN"
+    assert result["taxonomies"] == [{"code": "207Q00000X", "desc": "Family Medicine Physician", "primary": True,
+                                     "license": "A123", "state": "CA"}]
+    location = result["addresses"][0]
+    assert location["address_purpose"] == "LOCATION"
+    assert location["telephone_number"] == "559-555-1234"
+    assert location["country_name"] == "United States"
+    assert result["endpoints"] == []
+
+
+def test_search_organization_and_wildcard(index):
+    result = index.search({"organization_name": "valley*"})["results"][0]
+    assert result["enumeration_type"] == "NPI-2"
+    assert result["basic"]["organization_name"] == "VALLEY CLINIC"
+    assert index.search({"number": "1000000003"})["result_count"] == 0
+
+
+def test_postal_code_prefix_uses_index(index):
+    assert [r["number"] for r in index.search({"postal_code": "93721"})["results"]] == ["1000000001"]
+    plan = index._conn().execute(
+        "EXPLAIN QUERY PLAN SELECT p.* FROM providers p WHERE p.loc_postal_code LIKE ? ESCAPE '\\'"
+        " ORDER BY p.npi LIMIT ? OFFSET ?", ("93721%", 10, 0)
+    ).fetchall()
+    assert any(row[-1].startswith("SEARCH p USING INDEX providers_postal") for row in plan)